@@ -0,0 +1,115 @@
+"""
+Checks the LIPS extractor against the saved pages in fixtures/lips, served locally with http.server.
+- HTTP path: extract_sns_links_http on each saved profile (rows, and which profiles fall back to the browser)
+- Browser path: collect_user_urls over the saved listing pages, and extract_sns_links on each profile
+  with the fast fetch profile (skipped with --http-only)
+Expected output is in fixtures/lips/expected.json. Exits with status 1 on any mismatch.
+"""
+
+import argparse
+import asyncio
+import functools
+import http.server
+import json
+import os
+import tempfile
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+import extract_lips_sns as lips
+from fast_fetch import FetchProfile
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "lips")
+# Short timeouts: the fixtures are static, so anything missing is missing for good
+TIMEOUT_MS = 2000
+
+
+class FixtureHandler(http.server.SimpleHTTPRequestHandler):
+    """Serves /user/<name> as user/<name>.html and /project_lips?page=N as project_lips_pageN.html"""
+
+    def translate_path(self, path):
+        parts = urlsplit(path)
+        name = parts.path.strip("/") or "index"
+        page = parse_qs(parts.query).get("page")
+        if page:
+            name += f"_page{page[0]}"
+        return os.path.join(self.directory, name + ".html")
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_fixtures():
+    """Starts the fixture server on a free port; returns (server, site_url)"""
+    handler = functools.partial(FixtureHandler, directory=FIXTURES_DIR)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def compare(kind, path, got, expected, site_url):
+    if expected is not None:
+        expected = dict(expected, url=f"{site_url}{path}")
+    ok = got == expected
+    print(f"   [{kind}] {'ok  ' if ok else 'FAIL'} {path}" + ("" if ok else f"\n      got:      {got}\n      expected: {expected}"))
+    return ok
+
+
+async def check_http(site_url, expected):
+    http_fetcher = lips.HttpFetcher(4)
+    try:
+        results = [compare("HTTP", path, await lips.extract_sns_links_http(http_fetcher, f"{site_url}{path}"), row, site_url)
+                   for path, row in expected.items()]
+    finally:
+        await http_fetcher.aclose()
+    return all(results)
+
+
+async def check_browser(site_url, expected_listing, expected_rows):
+    from playwright.async_api import async_playwright
+
+    ok = True
+    with tempfile.TemporaryDirectory() as work_dir:
+        frontier = lips.CrawlFrontier(os.path.join(work_dir, "frontier.sqlite3"))
+        fetcher = FetchProfile(timeout_ms=TIMEOUT_MS)
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=True)
+            page = await browser.new_page()
+            await fetcher.attach(page)
+
+            queue = asyncio.Queue()
+            await lips.collect_user_urls(page, queue, lips.HostLimiter(0), frontier, fetcher=fetcher, site_url=site_url)
+            queued = [queue.get_nowait() for _ in range(queue.qsize())]
+            expected_urls = [f"{site_url}{path}" for path in expected_listing]
+            listing_ok = queued == expected_urls
+            print(f"   [Listing] {'ok  ' if listing_ok else 'FAIL'} {len(queued)} profiles queued"
+                  + ("" if listing_ok else f"\n      got:      {queued}\n      expected: {expected_urls}"))
+            ok &= listing_ok
+
+            for path, row in expected_rows.items():
+                ok &= compare("Browser", path, await lips.extract_sns_links(page, f"{site_url}{path}", fetcher), row, site_url)
+            await browser.close()
+        frontier.close()
+    return ok
+
+
+async def main(http_only=False):
+    with open(os.path.join(FIXTURES_DIR, "expected.json"), "r", encoding="utf-8") as f:
+        expected = json.load(f)
+    server, site_url = serve_fixtures()
+    print(f"Serving {FIXTURES_DIR} at {site_url}")
+    try:
+        ok = await check_http(site_url, expected["http"])
+        if not http_only:
+            ok &= await check_browser(site_url, expected["listing"], expected["browser"])
+    finally:
+        server.shutdown()
+    print("All fixture checks passed." if ok else "Fixture checks FAILED.")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the LIPS extractor against locally served HTML fixtures")
+    parser.add_argument("--http-only", action="store_true", help="Only check the HTTP path (no browser needed)")
+    args = parser.parse_args()
+    raise SystemExit(0 if asyncio.run(main(args.http_only)) else 1)
@@ -1,120 +1,476 @@
+import argparse
 import asyncio
 import csv
+import datetime
+import importlib.util
+import json
 import os
-from playwright.async_api import async_playwright
+import sqlite3
+import time
+from urllib.parse import urlsplit
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+from fast_fetch import FetchProfile
+from extraction_spec import extract, extract_html, field
 
-async def extract_sns_links(page, user_url):
+# --site-url can point this at a local server with saved HTML fixtures (check_lips_fixtures.py serves fixtures/lips)
+SITE_URL = "https://lipscosme.com"
+LISTING_PATH = "/project_lips"
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+OUTPUT_FILE = "lips_users_sns.csv"
+FRONTIER_FILE = "lips_crawl.sqlite3"
+FIELDNAMES = ["name", "url", "twitter", "instagram", "tiktok", "youtube", "other"]
+# What the fast fetch profile waits for instead of network idle. A profile counts as loaded once the name
+# renders; the SNS container renders after it, so it gets a short extra wait (users without SNS links have none)
+LISTING_SELECTOR = "a.UsersListLarge__link"
+PROFILE_SELECTOR = ".css-1tfct9s"
+SNS_SELECTOR = ".css-1hyr0v9"
+SNS_WAIT_MS = 2000
+
+# Fields read from each page in a single evaluate
+# User-specific SNS container found via investigation: the first .css-1hyr0v9 (links are a.chakra-link inside it;
+# other elements reuse the class, so only the first container is read)
+# Consistent selector for the user name: .css-1tfct9s
+PROFILE_SPEC = {
+    "name": field(".css-1tfct9s", "innerText"),
+    "links": field("a.chakra-link", "href", all=True, within=SNS_SELECTOR),
+    "has_sns": field(SNS_SELECTOR, "exists"),
+}
+LISTING_SPEC = {
+    "users": field("a.UsersListLarge__link", "href", all=True),
+    "has_next": field("a.lips-pagination__next", "exists"),
+}
+
+# Number of profile pages fetched in parallel, and requests per second allowed per host
+DEFAULT_CONCURRENCY = 4
+DEFAULT_HOST_RATE = 2.0
+# Profiles fetched in parallel in --http mode (browser pages are then only used for fallbacks)
+DEFAULT_HTTP_CONCURRENCY = 32
+# Failed profiles (and failed refetches of done ones) are retried on later runs up to this many failed attempts
+MAX_ATTEMPTS = 3
+
+
+class HostLimiter:
+    """
+    Per-host politeness limiter (replaces the fixed sleep between profiles).
+    Request starts to the same host are spaced at least 1/rate seconds apart,
+    no matter how many pages are fetching concurrently.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_slot = {}
+        self.lock = asyncio.Lock()
+
+    async def wait(self, url):
+        host = urlsplit(url).netloc
+        async with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, 0.0))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class CrawlFrontier:
+    """
+    Crawl state persisted in SQLite so a crash or a later recrawl does not start from page 1.
+    - pages: listing pages already scanned (and whether they had a next page)
+    - profiles: every profile URL seen, in discovery order, with fetch status and the extracted row.
+      attempts counts failed fetches since the last success; a failed refetch of a done profile keeps
+      its status and row and is only recorded in attempts / failed_at
+    Each update is its own transaction, so everything up to the last profile survives a crash.
+    """
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS pages (page INTEGER PRIMARY KEY, has_next INTEGER NOT NULL, users INTEGER NOT NULL, scanned_at TEXT NOT NULL)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS profiles (url TEXT PRIMARY KEY, seq INTEGER NOT NULL, status TEXT NOT NULL, "
+                        "attempts INTEGER NOT NULL DEFAULT 0, fetched_at TEXT, row TEXT, failed_at TEXT)")
+        columns = {r[1] for r in self.db.execute("PRAGMA table_info(profiles)")}
+        if "failed_at" not in columns:
+            self.db.execute("ALTER TABLE profiles ADD COLUMN failed_at TEXT")
+        self.db.commit()
+
+    def resume_page(self):
+        """Next listing page to scan when resuming, or None if the listing was already scanned to the end"""
+        row = self.db.execute("SELECT page, has_next FROM pages ORDER BY page DESC LIMIT 1").fetchone()
+        if not row:
+            return 1
+        return row[0] + 1 if row[1] else None
+
+    def mark_page(self, page, has_next, users):
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)",
+                            (page, int(has_next), users, datetime.datetime.now().isoformat()))
+
+    def add_profile(self, url):
+        """Records a profile URL. Returns False if it was already known"""
+        with self.db:
+            seq = self.db.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM profiles").fetchone()[0]
+            cur = self.db.execute("INSERT OR IGNORE INTO profiles (url, seq, status) VALUES (?, ?, 'pending')", (url, seq))
+        return cur.rowcount == 1
+
+    def due_profiles(self, since=None):
+        """Profiles to (re)fetch: pending, failed below MAX_ATTEMPTS, and done before `since` (same limit on failed refetches)"""
+        rows = self.db.execute(
+            "SELECT url FROM profiles WHERE status = 'pending' OR (status = 'failed' AND attempts < ?) "
+            "OR (status = 'done' AND ? IS NOT NULL AND fetched_at < ? AND attempts < ?) ORDER BY seq",
+            (MAX_ATTEMPTS, since, since, MAX_ATTEMPTS))
+        return [r[0] for r in rows]
+
+    def mark_done(self, url, row):
+        with self.db:
+            self.db.execute("UPDATE profiles SET status = 'done', attempts = 0, fetched_at = ?, row = ? WHERE url = ?",
+                            (datetime.datetime.now().isoformat(), json.dumps(row, ensure_ascii=False), url))
+
+    def mark_failed(self, url):
+        """A done profile keeps its status and row (the previous extraction stays in the output)"""
+        with self.db:
+            self.db.execute("UPDATE profiles SET status = CASE WHEN status = 'done' THEN 'done' ELSE 'failed' END, "
+                            "attempts = attempts + 1, failed_at = ? WHERE url = ?",
+                            (datetime.datetime.now().isoformat(), url))
+
+    def rows(self):
+        """Extracted rows in discovery order"""
+        return [json.loads(r[0]) for r in self.db.execute("SELECT row FROM profiles WHERE status = 'done' ORDER BY seq")]
+
+    def counts(self):
+        counts = dict(self.db.execute("SELECT status, COUNT(*) FROM profiles GROUP BY status").fetchall())
+        stale = self.db.execute("SELECT COUNT(*) FROM profiles WHERE status = 'done' AND attempts > 0").fetchone()[0]
+        if stale:
+            counts["done_refetch_failed"] = stale
+        return counts
+
+    def close(self):
+        self.db.close()
+
+
+class CsvStream:
+    """Appends each row to the CSV as soon as it is extracted (header only for a new file)"""
+
+    def __init__(self, path):
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.f = open(path, 'a', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.f, fieldnames=FIELDNAMES)
+        if new:
+            self.writer.writeheader()
+
+    def write(self, row):
+        self.writer.writerow(row)
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+def write_csv(path, rows):
+    """Rewrites the CSV atomically (drops rows superseded by a recrawl)"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        dict_writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        dict_writer.writeheader()
+        dict_writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+
+class HttpFetcher:
+    """
+    Pooled async HTTP client (httpx with keep-alive, and HTTP/2 when the h2 package is installed)
+    for profile pages whose SNS links are in the server-rendered HTML.
+    """
+
+    def __init__(self, max_connections):
+        import httpx
+        self.client = httpx.AsyncClient(
+            http2=importlib.util.find_spec("h2") is not None,
+            follow_redirects=True,
+            timeout=15.0,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            headers={"User-Agent": USER_AGENT, "Accept-Language": "ja,en;q=0.8"},
+        )
+
+    async def get(self, url):
+        """HTML of url, or None on an error response / network error"""
+        try:
+            response = await self.client.get(url)
+        except Exception as e:
+            print(f"HTTP error for {url}: {e}")
+            return None
+        return response.text if response.status_code == 200 else None
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+async def load_page(page, url, selector, fetcher=None, label=None):
+    """
+    Navigates with the resource-blocking fetch profile, or the old full load when fetcher is None.
+    Returns False if the selector did not appear (fast fetch only; the full load waited for network idle).
+    """
+    if fetcher:
+        load = await fetcher.goto(page, url, selector, label)
+        print(f"   [Fetch] {label}: {fetcher.describe(load, label)}")
+        return load.found
+    await page.goto(url, wait_until="networkidle")
+    return True
+
+def classify_sns_links(hrefs):
+    """Sorts profile link hrefs into SNS columns (last match wins; link aggregators are collected in "other")"""
+    sns_links = {
+        "twitter": "",
+        "instagram": "",
+        "tiktok": "",
+        "youtube": "",
+        "other": []
+    }
+    for href in hrefs:
+        if not href:
+            continue
+
+        if 'twitter.com' in href or 'x.com' in href:
+            sns_links["twitter"] = href
+        elif 'instagram.com' in href:
+            sns_links["instagram"] = href
+        elif 'tiktok.com' in href:
+            sns_links["tiktok"] = href
+        elif 'youtube.com' in href:
+            sns_links["youtube"] = href
+        elif any(domain in href for domain in ['lit.link', 'linktr.ee']):
+            sns_links["other"].append(href)
+    return sns_links
+
+def profile_row(user_url, record):
+    """Builds the CSV row from an extracted PROFILE_SPEC record"""
+    sns_links = classify_sns_links(record["links"])
+    return {
+        "name": (record["name"] or "Unknown").strip(),
+        "url": user_url,
+        "twitter": sns_links["twitter"],
+        "instagram": sns_links["instagram"],
+        "tiktok": sns_links["tiktok"],
+        "youtube": sns_links["youtube"],
+        "other": ", ".join(sns_links["other"])
+    }
+
+async def extract_sns_links(page, user_url, fetcher=None):
     """
     Extracts SNS links from a user's profile page.
     """
     try:
-        await page.goto(user_url, wait_until="networkidle")
-        
-        # Selectors for SNS links
-        # User-specific SNS container found via investigation: .css-1hyr0v9
-        sns_links = {
-            "twitter": "",
-            "instagram": "",
-            "tiktok": "",
-            "youtube": "",
-            "other": []
-        }
-        
-        # Target the specific container for user SNS links
-        container = await page.query_selector('.css-1hyr0v9')
-        if container:
-            links = await container.query_selector_all('a.chakra-link')
-            for link in links:
-                href = await link.get_attribute('href')
-                if not href:
-                    continue
-                
-                if 'twitter.com' in href or 'x.com' in href:
-                    sns_links["twitter"] = href
-                elif 'instagram.com' in href:
-                    sns_links["instagram"] = href
-                elif 'tiktok.com' in href:
-                    sns_links["tiktok"] = href
-                elif 'youtube.com' in href:
-                    sns_links["youtube"] = href
-                elif any(domain in href for domain in ['lit.link', 'linktr.ee']):
-                    sns_links["other"].append(href)
-        
-        # Extract user name (consistent selector for name: .css-1tfct9s)
-        name_elem = await page.query_selector('.css-1tfct9s')
-        name = await name_elem.inner_text() if name_elem else "Unknown"
-        
-        return {
-            "name": name.strip(),
-            "url": user_url,
-            "twitter": sns_links["twitter"],
-            "instagram": sns_links["instagram"],
-            "tiktok": sns_links["tiktok"],
-            "youtube": sns_links["youtube"],
-            "other": ", ".join(sns_links["other"])
-        }
+        if not await load_page(page, user_url, PROFILE_SELECTOR, fetcher, "profile"):
+            print(f"Profile did not render for {user_url}")
+            return None
+        if fetcher:
+            # Not waited for by the fast fetch; without it the row is saved with blank SNS columns, as before
+            try:
+                await page.wait_for_selector(SNS_SELECTOR, state="attached", timeout=SNS_WAIT_MS)
+            except PlaywrightTimeoutError:
+                pass
+        return profile_row(user_url, await extract(page, PROFILE_SPEC))
     except Exception as e:
         print(f"Error processing {user_url}: {e}")
         return None
 
-async def main():
-    base_url = "https://lipscosme.com/project_lips"
-    user_urls = []
-    
+async def extract_sns_links_http(http, user_url):
+    """
+    Extracts SNS links from the server-rendered HTML with the same PROFILE_SPEC.
+    Returns None when the page could not be fetched or could not be parsed, or the name or the SNS container
+    is missing (rendered client-side), so the caller falls back to the browser.
+    A container without links is a user without SNS links, saved as a row with blank SNS columns.
+    """
+    html = await http.get(user_url)
+    if html is None:
+        return None
+    try:
+        record = extract_html(html, PROFILE_SPEC)
+    except Exception as e:
+        print(f"Error parsing {user_url}: {e}")
+        return None
+    if record["name"] is None or not record["has_sns"]:
+        return None
+    return profile_row(user_url, record)
+
+async def collect_user_urls(page, queue, limiter, frontier, max_pages=None, refresh=False, since=None, fetcher=None,
+                            site_url=SITE_URL):
+    """
+    Producer: queues the profiles left over from earlier runs, then walks the listing pages and queues
+    each new profile URL as soon as it is seen, so profile extraction starts while pagination is still running.
+    - resume (default): continues pagination after the last scanned listing page
+    - refresh: rescans from page 1 and stops at the first page without any new profile
+      (the listing shows newest users first, so a recrawl only pays for what changed)
+    Returns the number of new profile URLs.
+    """
+    for url in frontier.due_profiles(since):
+        await queue.put(url)
+
+    seen = set()
+    new_users = 0
+    current_page = 1 if refresh else frontier.resume_page()
+    if current_page is None:
+        print("Listing already scanned to the end (use --changed-only or --since to look for new users).")
+        return 0
+    while max_pages is None or current_page <= max_pages:
+        url = f"{site_url}{LISTING_PATH}?page={current_page}"
+        print(f"Scanning page {current_page}: {url}")
+        await limiter.wait(url)
+        try:
+            loaded = await load_page(page, url, LISTING_SELECTOR, fetcher, "listing")
+        except Exception as e:
+            print(f"Error scanning {url}: {e}")
+            break
+        if not loaded:
+            # Not recorded as the end of the listing, so the next run resumes from this page
+            print(f"Listing did not render for {url}; stopping pagination.")
+            break
+
+        listing = await extract(page, LISTING_SPEC)
+        user_links = listing["users"]
+        if not user_links:
+            frontier.mark_page(current_page, False, 0)
+            break
+
+        page_new = 0
+        for href in user_links:
+            if href:
+                full_url = f"{site_url}{href}" if href.startswith('/') else href
+                if full_url not in seen:
+                    seen.add(full_url)
+                    if frontier.add_profile(full_url):
+                        page_new += 1
+                        await queue.put(full_url)
+        new_users += page_new
+
+        # Check if there's a next page
+        frontier.mark_page(current_page, listing["has_next"], len(user_links))
+        if not listing["has_next"]:
+            break
+        if refresh and page_new == 0:
+            print(f"No new users on page {current_page}; stopping pagination.")
+            break
+        current_page += 1
+
+    print(f"New users found: {new_users}")
+    return new_users
+
+async def profile_worker(pages, queue, limiter, frontier, out, stats, fetcher=None, http=None):
+    """
+    Consumer: extracts profiles from the queue until it receives None.
+    With http, the page is fetched over HTTP first and a browser page is borrowed from the pool only as a fallback.
+    """
+    while True:
+        user_url = await queue.get()
+        try:
+            if user_url is None:
+                return
+            await limiter.wait(user_url)
+            data = None
+            if http:
+                data = await extract_sns_links_http(http, user_url)
+                stats["http" if data else "fallback"] += 1
+                if data is None:
+                    await limiter.wait(user_url)
+            if data is None:
+                page = await pages.get()
+                try:
+                    data = await extract_sns_links(page, user_url, fetcher)
+                finally:
+                    pages.put_nowait(page)
+            stats["done"] += 1
+            if data:
+                frontier.mark_done(user_url, data)
+                out.write(data)
+            else:
+                frontier.mark_failed(user_url)
+            print(f"[{stats['done']} done, {queue.qsize()} queued] Processed: {user_url}")
+        finally:
+            queue.task_done()
+
+async def main(concurrency=DEFAULT_CONCURRENCY, host_rate=DEFAULT_HOST_RATE, max_pages=None, output_file=OUTPUT_FILE,
+               frontier_file=FRONTIER_FILE, refresh=False, since=None, fast=True,
+               http=False, http_concurrency=DEFAULT_HTTP_CONCURRENCY, site_url=SITE_URL, compare=False):
+    concurrency = max(1, concurrency)
+    workers_count = max(1, http_concurrency) if http else concurrency
+    limiter = HostLimiter(host_rate)
+    # Bounded so pagination does not run arbitrarily far ahead of extraction
+    queue = asyncio.Queue(maxsize=workers_count * 50)
+    frontier = CrawlFrontier(frontier_file)
+    out = CsvStream(output_file)
+    stats = {"done": 0, "http": 0, "fallback": 0}
+    fetcher = FetchProfile(compare=compare) if fast else None
+    http_fetcher = HttpFetcher(workers_count) if http else None
+    started = time.monotonic()
+
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=True)
         context = await browser.new_context()
-        page = await context.new_page()
-        
-        # Phase 1: Collect User URLs from all pages
-        print("Collecting user URLs...")
-        current_page = 1
-        while True:
-            url = f"{base_url}?page={current_page}"
-            print(f"Scanning page {current_page}: {url}")
-            await page.goto(url, wait_until="networkidle")
-            
-            user_links = await page.query_selector_all('a.UsersListLarge__link')
-            if not user_links:
-                break
-                
-            for link in user_links:
-                href = await link.get_attribute('href')
-                if href:
-                    full_url = f"https://lipscosme.com{href}" if href.startswith('/') else href
-                    if full_url not in user_urls:
-                        user_urls.append(full_url)
-            
-            # Check if there's a next page
-            next_button = await page.query_selector('a.lips-pagination__next')
-            if not next_button:
-                break
-            current_page += 1
-            
-        print(f"Total users found: {len(user_urls)}")
-        
-        # Phase 2: Extract SNS links from each user profile
-        results = []
-        for i, user_url in enumerate(user_urls):
-            print(f"[{i+1}/{len(user_urls)}] Processing: {user_url}")
-            data = await extract_sns_links(page, user_url)
-            if data:
-                results.append(data)
-            
-            # Simple rate limiting/politeness
-            await asyncio.sleep(1)
-            
-        # Phase 3: Save results to CSV
-        output_file = "lips_users_sns.csv"
-        keys = ["name", "url", "twitter", "instagram", "tiktok", "youtube", "other"]
-        with open(output_file, 'w', newline='', encoding='utf-8') as f:
-            dict_writer = csv.DictWriter(f, fieldnames=keys)
-            dict_writer.writeheader()
-            dict_writer.writerows(results)
-            
-        print(f"Extraction complete. Results saved to {output_file}")
-        
+        listing_page = await context.new_page()
+        pool = [await context.new_page() for _ in range(concurrency)]
+        if fetcher:
+            for page in [listing_page, *pool]:
+                await fetcher.attach(page)
+        pages = asyncio.Queue()
+        for page in pool:
+            pages.put_nowait(page)
+
+        # Phase 1 + 2: collect user URLs and extract SNS links concurrently
+        if http:
+            print(f"Collecting user URLs and extracting profiles over HTTP with {workers_count} workers "
+                  f"({concurrency} browser pages for fallbacks)...")
+        else:
+            print(f"Collecting user URLs and extracting profiles with {concurrency} pages...")
+        workers = [asyncio.create_task(profile_worker(pages, queue, limiter, frontier, out, stats, fetcher, http_fetcher))
+                   for _ in range(workers_count)]
+        try:
+            await collect_user_urls(listing_page, queue, limiter, frontier, max_pages, refresh, since, fetcher, site_url)
+        finally:
+            for _ in workers:
+                await queue.put(None)
+        await asyncio.gather(*workers)
+        if http_fetcher:
+            await http_fetcher.aclose()
         await browser.close()
 
+    # Phase 3: rows were streamed to the CSV as they were extracted; compact it
+    # into discovery order without rows superseded by a recrawl
+    out.close()
+    rows = frontier.rows()
+    write_csv(output_file, rows)
+    counts = frontier.counts()
+    frontier.close()
+
+    elapsed = time.monotonic() - started
+    print(f"Extraction complete: {stats['done']} profiles fetched in {elapsed:.0f}s "
+          f"({stats['done'] / elapsed if elapsed else 0:.2f} profiles/s). "
+          f"{len(rows)} rows saved to {output_file} (frontier: {counts})")
+    if http:
+        print(f"HTTP extraction: {stats['http']} profiles, browser fallbacks: {stats['fallback']}")
+    if fetcher:
+        print(fetcher.summary())
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Extract SNS links from LIPS user profiles")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Number of profile pages fetched in parallel")
+    parser.add_argument("--host-rate", type=float, default=DEFAULT_HOST_RATE, help="Max requests per second per host (0 = unlimited)")
+    parser.add_argument("--max-pages", type=int, help="Stop after this many listing pages")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="CSV output path")
+    parser.add_argument("--frontier", default=FRONTIER_FILE, help="Crawl state (SQLite) used to resume and recrawl")
+    parser.add_argument("--changed-only", action="store_true",
+                        help="Rescan the listing from page 1 and fetch only profiles not seen before")
+    parser.add_argument("--since", type=datetime.date.fromisoformat,
+                        help="Like --changed-only, and also refetch profiles last fetched before this date (YYYY-MM-DD)")
+    parser.add_argument("--http", action="store_true",
+                        help="Fetch profiles over HTTP and parse the HTML; use the browser only when the nodes are missing")
+    parser.add_argument("--http-concurrency", type=int, default=DEFAULT_HTTP_CONCURRENCY,
+                        help="Profiles fetched in parallel in --http mode (raise --host-rate to match)")
+    parser.add_argument("--site-url", default=SITE_URL, help="Site root (e.g. a local server with saved HTML fixtures)")
+    parser.add_argument("--full-load", action="store_true",
+                        help="Load every resource and wait for network idle (disables the fast fetch profile)")
+    parser.add_argument("--compare-full-load", action="store_true",
+                        help="Also load the first page of each kind the old way and report the savings against it")
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency, args.host_rate, args.max_pages, args.output, args.frontier,
+                     refresh=args.changed_only or args.since is not None,
+                     since=args.since.isoformat() if args.since else None, fast=not args.full_load,
+                     http=args.http, http_concurrency=args.http_concurrency, site_url=args.site_url.rstrip("/"),
+                     compare=args.compare_full_load))
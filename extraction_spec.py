@@ -0,0 +1,87 @@
+# Declarative extraction for the Playwright scrapers (extract_lips_sns.py, projects/affassion/scrape_shein.py).
+# A spec maps field name -> selector -> attribute, and the whole spec runs in a single page.evaluate,
+# instead of one CDP round trip per query_selector / get_attribute / text_content.
+
+# Special attributes: "text" = textContent, "innerText" = rendered text, "exists" = whether the selector matches.
+# Anything else is read with getAttribute (the raw value, e.g. a relative href).
+_EXTRACT_JS = """
+([spec, scope]) => {
+    const read = (el, attr) => {
+        if (attr === "text") return el.textContent;
+        if (attr === "innerText") return el.innerText;
+        if (attr === "exists") return true;
+        return el.getAttribute(attr);
+    };
+    const record = (scopeRoot) => {
+        const out = {};
+        for (const [name, f] of Object.entries(spec)) {
+            const root = f.within ? scopeRoot.querySelector(f.within) : scopeRoot;
+            if (!root) {
+                out[name] = f.all ? [] : (f.attr === "exists" ? false : null);
+            } else if (f.all) {
+                const els = f.selector ? root.querySelectorAll(f.selector) : [root];
+                out[name] = Array.from(els, el => read(el, f.attr)).filter(v => v !== null);
+            } else {
+                const el = f.selector ? root.querySelector(f.selector) : root;
+                out[name] = el ? read(el, f.attr) : (f.attr === "exists" ? false : null);
+            }
+        }
+        return out;
+    };
+    return scope ? Array.from(document.querySelectorAll(scope), record) : record(document);
+}
+"""
+
+
+def field(selector, attr="text", all=False, within=None):
+    """
+    One field of a spec. selector="" reads the scope element itself.
+    all=True returns a list with a value per match, otherwise the first match (None if missing).
+    within resolves selector inside the first element matching it only (missing = no match).
+    """
+    return {"selector": selector, "attr": attr, "all": all, "within": within}
+
+
+async def extract(page, spec, scope=None):
+    """
+    Runs the spec in one page.evaluate.
+    scope=None returns one record for the whole document; with a scope selector,
+    a list of records (one per matching element, fields resolved relative to it).
+    """
+    return await page.evaluate(_EXTRACT_JS, [spec, scope])
+
+
+def _read_node(node, attr):
+    if attr == "text":
+        return node.text(deep=True)
+    if attr == "innerText":
+        return node.text(deep=True, separator="\n", strip=True)
+    if attr == "exists":
+        return True
+    return node.attributes.get(attr)
+
+
+def extract_html(html, spec, scope=None):
+    """
+    Same as extract(), but against raw HTML with selectolax (no browser), for server-rendered pages.
+    innerText is approximated by the stripped text of each text node joined with newlines.
+    """
+    from selectolax.lexbor import LexborHTMLParser
+
+    def record(scope_root):
+        out = {}
+        for name, f in spec.items():
+            within = f.get("within")
+            root = scope_root.css_first(within) if within else scope_root
+            if root is None:
+                out[name] = [] if f["all"] else (False if f["attr"] == "exists" else None)
+            elif f["all"]:
+                nodes = root.css(f["selector"]) if f["selector"] else [root]
+                out[name] = [v for v in (_read_node(n, f["attr"]) for n in nodes) if v is not None]
+            else:
+                node = root.css_first(f["selector"]) if f["selector"] else root
+                out[name] = _read_node(node, f["attr"]) if node else (False if f["attr"] == "exists" else None)
+        return out
+
+    tree = LexborHTMLParser(html)
+    return [record(node) for node in tree.css(scope)] if scope else record(tree.root)
@@ -0,0 +1,139 @@
+import time
+from urllib.parse import urlsplit
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+# Shared fast fetch profile for the Playwright scrapers (extract_lips_sns.py, projects/affassion/scrape_shein.py).
+# They only read a few hrefs / attributes / text nodes, so everything that is not the document or the
+# scripts that render it is blocked, and navigation waits for the selector we need instead of network idle.
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "media", "font", "stylesheet", "texttrack", "manifest"})
+BLOCKED_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "googlesyndication.com",
+    "googleadservices.com", "facebook.net", "facebook.com", "analytics.tiktok.com", "hotjar.com",
+    "criteo.com", "criteo.net", "clarity.ms", "bing.com", "yjtag.jp", "ads-twitter.com",
+)
+DEFAULT_TIMEOUT_MS = 15000
+
+
+class PageLoad:
+    """Stats for one navigation. bytes is the sum of Content-Length of the responses (approximate)"""
+
+    def __init__(self, url, blocking):
+        self.url = url
+        self.blocking = blocking
+        self.elapsed = 0.0
+        self.requests = 0
+        self.blocked = 0
+        self.bytes = 0
+        self.found = False
+
+
+class FetchProfile:
+    """
+    Resource-blocking navigation for a pool of pages.
+    - attach(page) once per page, then goto(page, url, selector) instead of page.goto(..., wait_until="networkidle")
+    - with compare=True the first page of each label is also loaded the old way (full load + networkidle)
+      as a baseline, and every later load reports the bytes and time saved against it. Off by default:
+      it costs one extra full page load per label. If the baseline load fails it is skipped, not retried
+    """
+
+    def __init__(self, timeout_ms=DEFAULT_TIMEOUT_MS, compare=False,
+                 block_types=BLOCKED_RESOURCE_TYPES, block_hosts=BLOCKED_HOSTS):
+        self.timeout_ms = timeout_ms
+        self.compare = compare
+        self.block_types = block_types
+        self.block_hosts = block_hosts
+        self.current = {}   # page -> PageLoad in progress (responses arriving later still count)
+        self.baselines = {} # label -> PageLoad of the full load
+        self.loads = []
+
+    async def attach(self, page):
+        await page.route("**/*", lambda route: self._route(page, route))
+        page.on("response", lambda response: self._on_response(page, response))
+
+    def _blocked(self, request):
+        if request.resource_type in self.block_types:
+            return True
+        host = urlsplit(request.url).hostname or ""
+        return any(host == h or host.endswith("." + h) for h in self.block_hosts)
+
+    async def _route(self, page, route):
+        load = self.current.get(page)
+        if load and load.blocking and self._blocked(route.request):
+            load.blocked += 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+    def _on_response(self, page, response):
+        load = self.current.get(page)
+        if load:
+            load.requests += 1
+            length = response.headers.get("content-length", "")
+            if length.isdigit():
+                load.bytes += int(length)
+
+    async def goto(self, page, url, selector, label=None):
+        """
+        Loads url with blocking and waits until selector is attached.
+        Returns the PageLoad; found=False if the selector did not appear within the timeout.
+        """
+        if self.compare and label and label not in self.baselines:
+            try:
+                baseline = await self._full_load(page, url, selector)
+            except Exception as e:
+                # e.g. a networkidle timeout; the real fetch below must still run
+                self.baselines[label] = None
+                print(f"   [Fetch] Baseline '{label}' (full load) failed, skipping the comparison: {e}")
+            else:
+                self.baselines[label] = baseline
+                print(f"   [Fetch] Baseline '{label}' (full load): {baseline.elapsed:.2f}s, "
+                      f"{baseline.bytes / 1024:.0f} KB, {baseline.requests} requests")
+
+        load = PageLoad(url, blocking=True)
+        self.current[page] = load
+        started = time.monotonic()
+        await page.goto(url, wait_until="commit", timeout=self.timeout_ms * 2)
+        try:
+            await page.wait_for_selector(selector, state="attached", timeout=self.timeout_ms)
+            load.found = True
+        except PlaywrightTimeoutError:
+            pass
+        load.elapsed = time.monotonic() - started
+        self.loads.append((label, load))
+        return load
+
+    async def _full_load(self, page, url, selector):
+        load = PageLoad(url, blocking=False)
+        self.current[page] = load
+        started = time.monotonic()
+        await page.goto(url, wait_until="networkidle")
+        load.found = await page.query_selector(selector) is not None
+        load.elapsed = time.monotonic() - started
+        return load
+
+    def describe(self, load, label=None):
+        """One-line per-page report"""
+        text = f"{load.elapsed:.2f}s, {load.bytes / 1024:.0f} KB, {load.blocked} blocked"
+        baseline = self.baselines.get(label)
+        if baseline:
+            text += (f" (saved ~{(baseline.bytes - load.bytes) / 1024:.0f} KB, "
+                     f"{baseline.elapsed - load.elapsed:.2f}s vs full load)")
+        return text
+
+    def summary(self):
+        if not self.loads:
+            return "   [Fetch] No pages loaded."
+        n = len(self.loads)
+        elapsed = sum(load.elapsed for _, load in self.loads)
+        loaded = sum(load.bytes for _, load in self.loads)
+        blocked = sum(load.blocked for _, load in self.loads)
+        lines = [f"   [Fetch] {n} pages: avg {elapsed / n:.2f}s, {loaded / n / 1024:.0f} KB/page, {blocked} requests blocked"]
+        saved_bytes = saved_time = 0.0
+        for label, load in self.loads:
+            baseline = self.baselines.get(label)
+            if baseline:
+                saved_bytes += baseline.bytes - load.bytes
+                saved_time += baseline.elapsed - load.elapsed
+        if any(self.baselines.values()):
+            lines.append(f"   [Fetch] Estimated savings vs full load: ~{saved_bytes / 1024 / 1024:.1f} MB, {saved_time:.0f}s")
+        return "\n".join(lines)
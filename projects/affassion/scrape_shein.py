@@ -1,8 +1,16 @@
+import os
+import sys
 import asyncio
+import argparse
 import random
 import json
 from playwright.async_api import async_playwright
 
+# リポジトリ直下の共通モジュール (fast_fetch.py) を読み込む
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from fast_fetch import FetchProfile
+from extraction_spec import extract, field
+
 # ターゲット検索ワードリスト
 TARGET_ITEMS = [
     {"id": "pickup-1", "term": "polyresin vase", "category": "interior"},
@@ -14,8 +22,180 @@ TARGET_ITEMS = [
 ]
 
 BASE_URL = "https://jp.shein.com/pdsearch/"
+# 出力先 (.ndjson なら1行ずつ追記、.json なら <出力先>.partial.ndjson に追記して終了時に1回だけ配列に変換する)
+OUTPUT_PATH = "src/data/scraped_raw.json"
+# 検索ワードを並行して処理するページ数、ワードごとに辿る検索結果ページ数 (--terms 使用時)
+DEFAULT_CONCURRENCY = 3
+DEFAULT_MAX_PAGES = 3
+# 同じページでの次の遷移までの間隔 (秒、ランダム)
+PAUSE_RANGE = (0.5, 1.5)
+# 高速モードで networkidle / 固定待ちの代わりに待つ要素
+PRODUCT_SELECTOR = ".S-product-item, .product-card"
+
+# 商品カードごとに読む項目 (Selectors fallbacks)。ページ全体を1回の evaluate で取得する
+_NAME = ".S-product-item__name a, .goods-title-link"
+_IMG = ".S-product-item__img-container img, .product-card__img img"
+PRODUCT_SPEC = {
+    "name": field(_NAME, "text"),
+    "href": field(_NAME, "href"),
+    "price": field(".S-product-item__price, .product-price__value", "text"),
+    "src": field(_IMG, "src"),
+    "data_src": field(_IMG, "data-src"),
+}
+
+
+def product_row(item, record, rank=1):
+    """抽出した PRODUCT_SPEC のレコードを scraped_raw.json の1行にする (rank: ワード内での順位、2件目以降はidに付ける)"""
+    # src属性だけでなく data-src も確認（LazyLoad対策）
+    img_src = record["src"]
+    if not img_src or "data:image" in img_src:
+        img_src = record["data_src"]
+
+    # Absolute URL for SHEIN usually needed? No, src usually full or protocol relative
+    if img_src and img_src.startswith('//'):
+        img_src = 'https:' + img_src
+
+    # Link to product
+    link_href = record["href"]
+    if link_href and link_href.startswith('/'):
+        link_href = 'https://jp.shein.com' + link_href
+
+    return {
+        "id": item["id"] if rank == 1 else f"{item['id']}-{rank}",
+        "name": record["name"].strip(),
+        "price": (record["price"] or "").strip(),
+        "image": img_src,
+        "category": item["category"],
+        "description": f"Extracted from search: {item['term']}",
+        "sheinUrl": link_href
+    }
+
+
+def load_terms(path):
+    """
+    検索ワードファイルを読む。1行1ワードのテキスト、またはJSONL ({"id": ..., "term": ..., "category": ...})。
+    空行と # で始まる行は無視し、同じワードは1回だけ。
+    """
+    items = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            item = json.loads(line) if line.startswith("{") else {"term": line}
+            if item.get("term"):
+                item.setdefault("id", "term-" + "-".join(item["term"].lower().split()))
+                item.setdefault("category", "")
+                items.setdefault(item["term"], item)
+    return list(items.values())
+
+
+class RowWriter:
+    """
+    抽出した行を1行1JSONで逐次追記する (途中で止まってもそこまでの行は残る)
+    - .json 出力は <出力先>.partial.ndjson に追記し、close() で1回だけ配列に変換して置き換える
+      (途中で止まった場合、既存の .json は壊れず、そこまでの行は .partial.ndjson に残る)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.ndjson = path.endswith(".ndjson") or path.endswith(".jsonl")
+        self.stream_path = path if self.ndjson else path + ".partial.ndjson"
+        self.count = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.f = open(self.stream_path, "w", encoding="utf-8")
+
+    def write(self, rows):
+        if not rows:
+            return
+        for row in rows:
+            self.f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.f.flush()
+        self.count += len(rows)
+
+    def close(self):
+        self.f.close()
+        if self.ndjson:
+            return
+        with open(self.stream_path, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        os.remove(self.stream_path)
+
 
-async def run():
+async def load_search_page(page, url, fetcher):
+    if fetcher:
+        # 商品要素が現れた時点で読み取る (画像は読み込まず data-src から取る)
+        load = await fetcher.goto(page, url, PRODUCT_SELECTOR, "search")
+        print(f"   ⚡ {fetcher.describe(load, 'search')}")
+    else:
+        await page.goto(url, wait_until='domcontentloaded')
+        await page.wait_for_timeout(random.randint(2000, 4000))
+        
+        # スクロールして画像ロードを誘発
+        await page.evaluate("window.scrollBy(0, 500)")
+        await page.wait_for_timeout(1000)
+
+
+async def scrape_term(page, item, fetcher, writer, seen, max_pages=1, first_only=False):
+    """1つの検索ワードの結果ページを max_pages まで辿り、商品カードを全て (first_only なら先頭だけ) 保存する"""
+    term = item["term"]
+    rank = 0
+    for page_no in range(1, max_pages + 1):
+        url = f"{BASE_URL}{term}" + (f"?page={page_no}" if page_no > 1 else "")
+        print(f"\n🔍 検索中: {term} (p.{page_no}) -> {url}")
+        
+        try:
+            await load_search_page(page, url, fetcher)
+
+            # 商品リスト待機
+            # S-product-item__wrapper などを探す
+            records = await extract(page, PRODUCT_SPEC, scope=PRODUCT_SELECTOR)
+        except Exception as e:
+            print(f"   ⚠️ ページ遷移エラー: {e}")
+            return
+        
+        if not records:
+            print("   ❌ 商品が見つかりませんでした")
+            return
+        if first_only:
+            records = records[:1]
+
+        rows = []
+        for record in records:
+            if not record["name"]:
+                continue
+            row = product_row(item, record, rank + 1)
+            # 別のワード・ページで取得済みの商品は飛ばす (順位は保存する行にだけ振る)
+            if row["sheinUrl"] in seen:
+                continue
+            if row["sheinUrl"]:
+                seen.add(row["sheinUrl"])
+            rank += 1
+            rows.append(row)
+        writer.write(rows)
+        print(f"   ✅ {term} p.{page_no}: {len(records)}件中 {len(rows)}件を保存 (累計 {writer.count}件)")
+        # 重複で1件も保存しなかったページでも、商品があれば次のページへ進む
+        if first_only:
+            return
+        await page.wait_for_timeout(random.uniform(*PAUSE_RANGE) * 1000)
+
+
+async def term_worker(page, queue, fetcher, writer, seen, max_pages, first_only):
+    while True:
+        item = await queue.get()
+        try:
+            if item is None:
+                return
+            await scrape_term(page, item, fetcher, writer, seen, max_pages, first_only)
+        finally:
+            queue.task_done()
+
+
+async def run(items=TARGET_ITEMS, concurrency=1, max_pages=1, first_only=True, output_path=OUTPUT_PATH, fast=True):
     async with async_playwright() as p:
         print("🚀 ブラウザを起動します...")
         
@@ -50,77 +230,45 @@ async def run():
         print("="*50 + "\n")
         input(">> 準備完了したらEnterを押して続行: ")
 
-        extracted_data = []
-
-        for item in TARGET_ITEMS:
-            term = item["term"]
-            url = f"{BASE_URL}{term}"
-            print(f"\n🔍 検索中: {term} -> {url}")
-            
-            try:
-                await page.goto(url, wait_until='domcontentloaded')
-                await page.wait_for_timeout(random.randint(2000, 4000))
-                
-                # スクロールして画像ロードを誘発
-                await page.evaluate("window.scrollBy(0, 500)")
-                await page.wait_for_timeout(1000)
-
-                # 商品リスト待機
-                # S-product-item__wrapper などを探す
-                product = page.locator('.S-product-item, .product-card').first
-                
-                # タイムアウト付きで要素確認
-                if await product.count() > 0:
-                    print("   📦 商品検出")
-                    
-                    # データ取得 (Selectors fallbacks)
-                    try:
-                        name_el = product.locator('.S-product-item__name a, .goods-title-link').first
-                        price_el = product.locator('.S-product-item__price, .product-price__value').first
-                        img_el = product.locator('.S-product-item__img-container img, .product-card__img img').first
-                        
-                        name = await name_el.text_content()
-                        price = await price_el.text_content()
-                        # src属性だけでなく data-src も確認（LazyLoad対策）
-                        img_src = await img_el.get_attribute('src')
-                        if not img_src or "data:image" in img_src:
-                             img_src = await img_el.get_attribute('data-src')
-
-                        # Absolute URL for SHEIN usually needed? No, src usually full or protocol relative
-                        if img_src and img_src.startswith('//'):
-                            img_src = 'https:' + img_src
-
-                        # Link to product
-                        link_href = await name_el.get_attribute('href')
-                        if link_href and link_href.startswith('/'):
-                            link_href = 'https://jp.shein.com' + link_href
-
-                        print(f"   ✅ 取得成功: {name.strip()[:20]}... / {price.strip()}")
-                        
-                        extracted_data.append({
-                            "id": item["id"],
-                            "name": name.strip(),
-                            "price": price.strip(),
-                            "image": img_src,
-                            "category": item["category"],
-                            "description": f"Extracted from search: {term}",
-                            "sheinUrl": link_href
-                        })
-
-                    except Exception as e:
-                        print(f"   ⚠️ データ抽出失敗: {e}")
-                else:
-                    print("   ❌ 商品が見つかりませんでした")
-                    
-            except Exception as e:
-                print(f"   ⚠️ ページ遷移エラー: {e}")
-
-        print("\n💾 データを保存します...")
-        with open('src/data/scraped_raw.json', 'w', encoding='utf-8') as f:
-            json.dump(extracted_data, f, indent=2, ensure_ascii=False)
-        
+        # 同じコンテキスト (Cookie共有) にページを足すので、CAPTCHAは1回解けば全ページで通る
+        pool = [page] + [await context.new_page() for _ in range(max(1, concurrency) - 1)]
+
+        # CAPTCHAは画像が必要なので、解いた後から画像・フォント・解析タグをブロックする
+        fetcher = None
+        if fast:
+            fetcher = FetchProfile()
+            for pool_page in pool:
+                await fetcher.attach(pool_page)
+
+        writer = RowWriter(output_path)
+        seen = set()
+        queue = asyncio.Queue()
+        for item in items:
+            queue.put_nowait(item)
+        for _ in pool:
+            queue.put_nowait(None)
+        print(f"📋 {len(items)}ワードを {len(pool)}ページで並行処理します (最大 {max_pages}ページ/ワード)")
+        await asyncio.gather(*(term_worker(pool_page, queue, fetcher, writer, seen, max_pages, first_only)
+                               for pool_page in pool))
+        writer.close()
+
+        print(f"\n💾 {writer.count}件を保存しました: {output_path}")
+        if fetcher:
+            print(fetcher.summary())
         print("🎉 全処理完了。ブラウザを閉じます。")
         await browser.close()
 
 if __name__ == "__main__":
-    asyncio.run(run())
+    parser = argparse.ArgumentParser(description="SHEIN検索結果から商品情報を取得する")
+    parser.add_argument("--terms", help="検索ワードファイル (1行1ワード、またはJSONL)。指定すると全商品カードを並行取得する")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="並行して使うページ数 (--terms 使用時)")
+    parser.add_argument("--max-pages", type=int, default=DEFAULT_MAX_PAGES, help="ワードごとに辿る検索結果ページ数 (--terms 使用時)")
+    parser.add_argument("--output", default=OUTPUT_PATH, help="出力先 (.json または .ndjson)")
+    parser.add_argument("--full-load", action="store_true", help="画像なども全て読み込み、固定時間待つ (高速モードを無効化)")
+    args = parser.parse_args()
+    if args.terms:
+        asyncio.run(run(load_terms(args.terms), args.concurrency, args.max_pages, first_only=False,
+                        output_path=args.output, fast=not args.full_load))
+    else:
+        # 従来通り: TARGET_ITEMS の各ワードから先頭の1商品だけ
+        asyncio.run(run(output_path=args.output, fast=not args.full_load))
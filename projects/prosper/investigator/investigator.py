@@ -1,29 +1,146 @@
+import time
+_STARTED = time.perf_counter() # コールドスタート計測用 (--startup-time)
+
 import os
 import argparse
 import json
-import time
 import datetime
-from google import genai
-from google.genai import types
-from dotenv import load_dotenv
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from rate_limiter import RateLimiter, estimate_tokens, retry_after_seconds
+from quota_scheduler import QuotaScheduler, QuotaExhausted, load_api_keys
+from topic_pipeline import SectionStream, AdaptiveBundler
+from report_writer import ReportWriter
+from state_store import StateStore
+from research_index import ResearchIndex
+from tracing import Tracer
+from response_cache import ResponseCache, TextResponse, CacheMiss, request_key, DEFAULT_TTL_DAYS, DEFAULT_MAX_MB
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ENV_PATH = os.path.join(BASE_DIR, "../../../.env")
+
+# google.genai は読み込みだけで時間がかかるので、最初にAPIクライアントを作るときまで読み込まない
+# (--help / --dry-run / --cache-only ではSDKに触れない)
+genai = None
+
+
+def load_env():
+    """リポジトリ直下の .env (無ければカレントの .env) を読み込む"""
+    from dotenv import load_dotenv
+    if os.path.exists(ENV_PATH):
+        load_dotenv(ENV_PATH)
+    else:
+        load_dotenv() # Fallback to default
+
+
+def load_genai():
+    global genai
+    if genai is None:
+        started = time.perf_counter()
+        from google import genai as sdk
+        genai = sdk
+        print(f"   [Startup] google.genai loaded in {time.perf_counter() - started:.2f}s")
+    return genai
+
+
+# 全てのキー×モデルがクールダウン中のとき、回復を待つ最大秒数
+MAX_COOLDOWN_WAIT = 300
+
+# 1リクエストにまとめるトピック数の初期値 (以降は実測で調整)
+BUNDLE_SIZE = 5
+# 応答に含まれなかった・失敗したトピックを単独で再投入する回数
+MAX_TOPIC_RETRIES = 2
+
+# LLM応答キャッシュ (日付・テーマをまたいで再利用する)
+CACHE_PATH = os.path.join(BASE_DIR, "cache", "responses.sqlite3")
 
-# 環境変数の読み込み
-env_path = os.path.join(os.path.dirname(__file__), "../../../.env")
-print(f"DEBUG: Looking for .env at: {os.path.abspath(env_path)}")
-print(f"DEBUG: Exists? {os.path.exists(env_path)}")
+# カレントディレクトリに依存しないよう、スクリプトの場所を基準にする
+RULES_PATH = os.path.join(BASE_DIR, "RESEARCH_RULES.md")
+STATE_DIR = os.path.join(BASE_DIR, "state")
+REPORTS_DIR = os.path.join(BASE_DIR, "reports")
+# --dry-run の state・レポートはこのサブディレクトリに書く (索引は直下しか見ないので再利用されない)
+DRY_RUN_SUBDIR = "dry_run"
+# 過去のレポート・stateの索引 (近いテーマ・トピックは再調査せずに再利用する。--reuse で有効)
+INDEX_PATH = os.path.join(BASE_DIR, "index", "research_index.json")
+REUSE_DAYS = 30
+REUSE_THRESHOLD = 0.8
+# テーマ同士の類似度がこれ以上の過去調査だけを再利用の候補にする (トピックより厳しく)
+REUSE_THEME_THRESHOLD = 0.9
+
+def load_batch_jobs(path):
+    """
+    バッチ投入ファイルを読む。1行1テーマのテキスト、またはJSONL ({"theme": ..., "output": ..., "ai_plan": ...})。
+    空行と # で始まる行は無視し、同じテーマは1回だけ。
+    """
+    jobs = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            job = json.loads(line) if line.startswith("{") else {"theme": line}
+            if job.get("theme"):
+                jobs.setdefault(job["theme"], job)
+    return list(jobs.values())
+
+
+class ThemeRun:
+    """1テーマ分の調査状態 (計画したトピック・完了済みトピック・state・レポート出力)"""
+
+    def __init__(self, theme, topics, store, report):
+        self.theme = theme
+        self.topics = topics
+        self.store = store
+        self.done = store.done_topics() # 本文はstoreに置き、メモリには持たない
+        self.report = report
+
+    @property
+    def pending(self):
+        return [t for t in self.topics if t not in self.done]
+
+    def record(self, topic, body):
+        self.store.put(topic, body)
+        self.done.add(topic)
+        self.report.append(topic, body)
+
+    def close(self):
+        self.report.close()
+        self.store.close()
+
+
+class StreamInterrupted(Exception):
+    """ストリーミング出力の途中で失敗した (確定済みのトピックは保存済み、残りは再投入する)"""
+
+
+def topic_key(topic):
+    """テーマ間で同じトピックを見分けるための正規化キー"""
+    return " ".join(topic.split()).lower()
 
-if os.path.exists(env_path):
-    load_dotenv(env_path)
-else:
-    load_dotenv() # Fallback to default
 
 class ProsperInvestigator:
-    def __init__(self, model_name=None):
-        self.api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-        if not self.api_key:
+    def __init__(self, model_name=None, concurrency=3, rpm=None, tpm=None,
+                 cache_path=CACHE_PATH, cache_only=False, cache_ttl_days=DEFAULT_TTL_DAYS, cache_max_mb=DEFAULT_MAX_MB,
+                 max_cooldown_wait=MAX_COOLDOWN_WAIT, reuse_days=0, reuse_threshold=REUSE_THRESHOLD,
+                 reuse_theme_threshold=REUSE_THEME_THRESHOLD,
+                 trace_path=None, dry_run=False):
+        # 計測スパン (trace_path を指定するとJSONL / Chrome traceに書き出す)
+        self.tracer = Tracer(trace_path)
+        
+        self.dry_run = dry_run
+        self.cache_only = cache_only
+        # APIを呼ばないモード (dry-run / cache-only) ではキーが無くても動く
+        offline = dry_run or cache_only
+        
+        # 複数キー対応: GEMINI_API_KEYS=key1,key2 (GEMINI_API_KEY / GOOGLE_API_KEY も併用)
+        load_env()
+        self.api_keys = load_api_keys()
+        if not self.api_keys and not offline:
             raise ValueError("API Key not found in .env (GEMINI_API_KEY or GOOGLE_API_KEY)")
         
-        self.client = genai.Client(api_key=self.api_key)
+        self.clients = {} # キー番号 -> genai.Client (初回のAPI呼び出し時に作る)
+        self.client_lock = threading.Lock()
         
         # モデル優先順位リスト
         # ユーザー指定があればそれを最優先、なければデフォルト順
@@ -35,25 +152,103 @@ class ProsperInvestigator:
         else:
             self.model_candidates = ["models/gemini-2.5-flash", "models/gemini-2.5-flash-lite"]
             
-        self.current_model_index = 0
         self.model_name = self.model_candidates[0]
-            
-        print(f"DEBUG: Initialized with model priority: {self.model_candidates}")
+
+        # 全スレッドで共有する (キー, モデル) 別のRPM/TPM制限 (固定sleepの代わり)
+        self.limiter = RateLimiter(rpm=rpm, tpm=tpm)
+        # キー×モデルへの振り分けとクールダウン管理 (優先モデルは回復したら自動的に戻る)
+        self.scheduler = None
+        if self.api_keys:
+            self.scheduler = QuotaScheduler(self.api_keys, self.model_candidates, self.limiter,
+                                            max_wait=max_cooldown_wait, tracer=self.tracer)
+        self.concurrency = max(1, concurrency)
+        self.progress_lock = threading.Lock() # 完了トピックをワーカースレッドから記録するため
+
+        # 応答キャッシュ (cache_path=None で無効)。cache_only はAPIを呼ばずキャッシュだけで再生する
+        self.cache = None
+        if cache_path:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            self.cache = ResponseCache(cache_path, ttl_days=cache_ttl_days, max_mb=cache_max_mb)
+        if cache_only and not self.cache:
+            raise ValueError("--cache-only requires the response cache")
+
+        # 過去調査の索引 (reuse_days=0 で無効 = 既定)。初回参照時に差分更新する
+        self.reuse_days = reuse_days
+        self.reuse_threshold = reuse_threshold
+        self.reuse_theme_threshold = reuse_theme_threshold
+        self.index = None
+        self.index_lock = threading.Lock()
+
         self.research_rules = self._load_rules()
-        self.dry_run = False # Default
-
-    def _switch_model(self):
-        """次のモデルに切り替える。切り替え不可ならFalseを返す"""
-        if self.current_model_index + 1 < len(self.model_candidates):
-            self.current_model_index += 1
-            self.model_name = self.model_candidates[self.current_model_index]
-            print(f"   [System] ⚠️ Quota Exceeded. Switching to fallback model: {self.model_name}")
-            return True
-        return False
 
-    def _generate_with_fallback(self, contents, config=None, use_tools=False):
-        """API呼び出しのラッパー。429エラー時にモデルを切り替えてリトライする"""
+    @property
+    def client(self):
+        """1本目のキーのクライアント (--list-models 用)"""
+        return self._client_for(0)
+
+    def _client_for(self, key_index):
+        if not self.api_keys:
+            raise ValueError("API Key not found in .env (GEMINI_API_KEY or GOOGLE_API_KEY)")
+        with self.client_lock:
+            if key_index not in self.clients:
+                self.clients[key_index] = load_genai().Client(api_key=self.api_keys[key_index])
+            return self.clients[key_index]
+
+    def _cache_key(self, model, contents, config=None, use_tools=False):
+        if use_tools:
+            config_key = {"tools": ["google_search"]}
+        elif hasattr(config, "model_dump"):
+            config_key = config.model_dump(mode="json", exclude_none=True)
+        else:
+            config_key = config
+        return request_key(model, contents, config_key)
+
+    def _cached_response(self, model, contents, config=None, use_tools=False):
+        """キャッシュ済みの応答を返す。cache_onlyでは他の候補モデルの応答も使う"""
+        models = [model]
+        if self.cache_only:
+            models += [m for m in self.model_candidates if m != model]
+        for m in models:
+            text = self.cache.get(self._cache_key(m, contents, config, use_tools))
+            if text is not None:
+                return TextResponse(text)
+        if self.cache_only:
+            raise CacheMiss(f"No cached response for this request ({model})")
+        return None
+
+    def _generate_stream(self, client, model, contents, config, on_chunk, progress):
+        """ストリーミングで生成し、届いたテキストごとに on_chunk を呼ぶ。全文をまとめた応答を返す"""
+        parts = []
+        usage = None
+        for chunk in client.models.generate_content_stream(model=model, contents=contents, config=config):
+            text = chunk.text or ""
+            if text:
+                progress["streamed"] = True
+                parts.append(text)
+                on_chunk(text)
+            usage = getattr(chunk, "usage_metadata", None) or usage
+        return TextResponse("".join(parts), usage)
+
+    def _generate_with_fallback(self, contents, config=None, use_tools=False, on_chunk=None):
+        """
+        API呼び出しのラッパー。QuotaSchedulerが選んだ (キー, モデル) のレート制限枠を取得してから呼び出す。
+        429エラー時はその組をクールダウンさせ、別の組（または回復した組）でリトライする。
+        on_chunk を渡すとストリーミングで生成する（出力途中で失敗した場合は二重出力を避けるためリトライしない）
+        """
+        if self.cache:
+            cached = self._cached_response(self.model_name, contents, config, use_tools)
+            if cached:
+                self.tracer.event("cache_hit")
+                if on_chunk:
+                    on_chunk(cached.text)
+                return cached
+        
+        est_tokens = estimate_tokens(contents)
+        progress = {"streamed": False}
         while True:
+            slot = self.scheduler.choose(est_tokens) # 全滅時は QuotaExhausted
+            model = slot.model
+            client = self._client_for(slot.key_index)
             try:
                 # Tool指定がある場合のConfig構築
                 # 引数 config があればそれを使うが、use_tools=Trueなら強制的にSearchツールを入れる
@@ -61,39 +256,87 @@ class ProsperInvestigator:
                 
                 final_config = config
                 if use_tools:
-                     final_config = types.GenerateContentConfig(
-                        tools=[types.Tool(google_search=types.GoogleSearch())]
-                    )
-
-                response = self.client.models.generate_content(
-                    model=self.model_name,
-                    contents=contents,
-                    config=final_config
-                )
+                    # SDKはdictのconfigも受け付けるので、google.genai.types を読み込まずに済む
+                    final_config = {"tools": [{"google_search": {}}]}
+
+                waited = self.limiter.acquire(model, est_tokens, key=slot.key_index)
+                if waited > 0:
+                    self.tracer.add_wait("rate_limit_wait", waited, slot=slot.name)
+                with self.tracer.span("generate", "api", slot=slot.name, stream=bool(on_chunk)) as span:
+                    if on_chunk:
+                        response = self._generate_stream(client, model, contents, final_config, on_chunk, progress)
+                    else:
+                        response = client.models.generate_content(
+                            model=model,
+                            contents=contents,
+                            config=final_config
+                        )
+                    usage = getattr(response, "usage_metadata", None)
+                    span.update(self.tracer.usage(model, usage))
+                tokens = getattr(usage, "total_token_count", None)
+                self.limiter.settle(model, est_tokens, tokens, key=slot.key_index)
+                headers = getattr(getattr(response, "sdk_http_response", None), "headers", None)
+                self.scheduler.record_success(slot, tokens, headers)
+                if self.cache:
+                    self.cache.put(self._cache_key(model, contents, config, use_tools), model, response.text)
                 return response
                 
             except Exception as e:
                 error_str = str(e)
-                if "429" in error_str or "RESOURCE_EXHAUSTED" in error_str:
-                    print(f"   [Quota] Limit reached for {self.model_name}.")
-                    if self._switch_model():
-                        print("   [Retry] Retrying with new model in 5s...")
-                        time.sleep(5)
-                        continue # Retry loop
-                    else:
-                        print("   [Quota] All models exhausted. Giving up.")
-                        raise e # そのまま例外を投げて上位で保存処理させる
+                rate_limited = "429" in error_str or "RESOURCE_EXHAUSTED" in error_str
+                if progress["streamed"]:
+                    # 出力済みの部分を二重に流さないよう、ここではリトライせず呼び出し側で未完了トピックを再投入させる
+                    if rate_limited:
+                        self.scheduler.record_429(slot, retry_after_seconds(e))
+                    raise StreamInterrupted(f"Stream interrupted after partial output: {e}") from e
+                if rate_limited:
+                    self.scheduler.record_429(slot, retry_after_seconds(e))
+                    continue # 別の組で Retry (全滅なら choose が QuotaExhausted を投げて上位で保存処理させる)
                 else:
                     raise e # その他のエラーは即座に投げる
 
     def _load_rules(self):
         """RESEARCH_RULES.mdを読み込む"""
         try:
-            with open("projects/prosper/investigator/RESEARCH_RULES.md", "r", encoding="utf-8") as f:
+            with open(RULES_PATH, "r", encoding="utf-8") as f:
                 return f.read()
         except FileNotFoundError:
             return "No specific rules found."
 
+    def _research_index(self):
+        """過去のレポート・stateの索引 (無効ならNone)"""
+        if not self.reuse_days:
+            return None
+        with self.index_lock:
+            if self.index is None:
+                self.index = ResearchIndex(INDEX_PATH, REPORTS_DIR, STATE_DIR)
+                self.index.refresh()
+            return self.index
+
+    def _reuse_past_research(self, run):
+        """未完了トピックのうち、最近の調査で十分近いものは本文を再利用して完了扱いにする"""
+        index = self._research_index()
+        if not index or not run.pending:
+            return
+        reused = 0
+        for topic in run.pending:
+            # 近いテーマの過去セクションだけが候補。トピックごとに最も近い1件だけを使う
+            for score, doc in index.search(run.theme, topic, self.reuse_theme_threshold,
+                                           max_age_days=self.reuse_days, limit=5):
+                if score < self.reuse_threshold:
+                    break
+                if doc["source"] == run.store.path:
+                    continue
+                content = index.load_content(doc)
+                if content:
+                    source = os.path.basename(doc["source"])
+                    print(f"   [Index] Reusing '{topic[:40]}' from {source} (similarity {score:.2f})")
+                    run.record(topic, f"{content}\n\n_(Reused from {source}, similarity {score:.2f})_")
+                    reused += 1
+                    break
+        if reused:
+            print(f"   [Index] Reused {reused} topics from past research (within {self.reuse_days} days).")
+
     def plan_research(self, theme, use_ai=False):
         """Phase 1: 調査計画の立案 (トピック分解)"""
         print(f"   [Planning] Analyzing theme: '{theme}'...")
@@ -114,6 +357,13 @@ class ProsperInvestigator:
             print("   [Dry Run] Returning mock topics.")
             return ["Mock Topic 1", "Mock Topic 2", "Mock Topic 3", "Mock Topic 4", "Mock Topic 5"]
 
+        # 最近近いテーマを調べていれば、その計画を再利用する (0 API calls)
+        index = self._research_index()
+        if index:
+            topics = index.theme_topics(theme, self.reuse_days, self.reuse_theme_threshold)
+            if topics:
+                return topics
+
         prompt = f"""
         あなたはプロの調査プランナーです。以下のテーマについて、徹底的な調査を行うための「調査トピックリスト」を作成してください。
         
@@ -131,9 +381,7 @@ class ProsperInvestigator:
         
         response = self._generate_with_fallback(
             contents=prompt,
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json"
-            )
+            config={"response_mime_type": "application/json"}
         )
         
         try:
@@ -165,17 +413,11 @@ class ProsperInvestigator:
         6. Language: Japanese (but keep English terms where appropriate).
         """
         
-        # APIレート制限対策 (Free Tier/Flash RPM 5 = 12s/req -> 安全マージンで15s)
-        print("      [Rate Limit] Waiting 15s...")
-        time.sleep(15) 
-        
+        # APIレート制限は _generate_with_fallback 内のRateLimiterが管理する
         try:
-            response = self.client.models.generate_content(
-                model=self.model_name,
+            response = self._generate_with_fallback(
                 contents=prompt,
-                config=types.GenerateContentConfig(
-                    tools=[types.Tool(google_search=types.GoogleSearch())]
-                )
+                use_tools=True
             )
             
             # Debug metadata
@@ -190,137 +432,246 @@ class ProsperInvestigator:
             print(f"      [Error] Failed to research topic '{topic}': {e}")
             return f"Error researching {topic}: {str(e)}"
 
-    def aggregate_report(self, theme, results):
-        """Phase 3: レポート集約 (Simple Concatenation - API-free)"""
-        print("   [Aggregation] Compiling final report (Concatenation)...")
+    def _research_bundle(self, batch, on_section):
+        """
+        ワーカースレッド: 1バンドルをストリーミングで調査し、トピックの本文が確定するたびに on_section を呼ぶ。
+        (確定したトピック数, 所要時間, うちレート制限待ち) を返す
+        """
+        started = time.perf_counter()
+        waited_before = self.limiter.thread_waited()
+        with self.tracer.span("batch", "batch", topics=len(batch)) as span:
+            stream = SectionStream(batch, on_section)
+            self.conduct_bundled_research(batch, on_chunk=stream.feed)
+            sections = stream.close()
+            span["sections"] = len(sections)
+        return len(sections), time.perf_counter() - started, self.limiter.thread_waited() - waited_before
+
+    def _research_topics(self, pending_topics, on_section):
+        """
+        未完了トピックを共有のワーカープールで並行に調査する。
+        - 応答はストリーミングで受け取り、トピックの本文が確定した時点で on_section(topic, body) を呼ぶ
+        - 失敗したバンドルや、応答に含まれなかったトピックは単独で再投入する
+        - バンドルサイズは所要時間とレート制限待ちから調整する
+        429でクォータが尽きた場合はFalseを返す
+        """
+        bundler = AdaptiveBundler(initial=BUNDLE_SIZE)
+        queue = deque(pending_topics)
+        attempts = {t: 0 for t in pending_topics}
+        in_flight = {}
+        batch_no = 0
+        finished = set()
+        
+        def record(topic, body):
+            with self.progress_lock:
+                finished.add(topic)
+            on_section(topic, body)
         
+        exhausted = False
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            while (queue and not exhausted) or in_flight:
+                # 空いているワーカーに次のバンドルを割り当てる (再投入されたトピックは単独で)
+                while queue and not exhausted and len(in_flight) < self.concurrency:
+                    batch = [queue.popleft()]
+                    if attempts[batch[0]] == 0:
+                        while queue and len(batch) < bundler.size and attempts[queue[0]] == 0:
+                            batch.append(queue.popleft())
+                    batch_no += 1
+                    print(f"   [Batch {batch_no}] Processing {len(batch)} topics: {batch[0][:20]}...")
+                    in_flight[executor.submit(self._research_bundle, batch, record)] = (batch_no, batch)
+                
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    no, batch = in_flight.pop(future)
+                    try:
+                        sections, elapsed, waited = future.result()
+                    except Exception as e:
+                        print(f"   [Error] Batch {no} failed: {e}")
+                        # 全てのキー×モデルが尽きたら新しいバンドルは出さず、実行中のバンドルの出力を受け取ってから終了する
+                        if isinstance(e, QuotaExhausted):
+                            if not exhausted:
+                                print(f"   [Quota] API Limit Reached. Waiting for {len(in_flight)} running batches, then exiting.")
+                            exhausted = True
+                            continue
+                        bundler.record(len(batch), 0.0, 0.0, complete=False)
+                    else:
+                        bundler.record(len(batch), elapsed, waited, complete=sections == len(batch))
+                        print(f"   [Batch {no}] Done in {elapsed:.1f}s: {sections}/{len(batch)} topics "
+                              f"({len(finished)}/{len(pending_topics)} total)")
+                    # 失敗したバンドルでも、ストリーミング中に確定したトピックは保存済み
+                    with self.progress_lock:
+                        missing = [t for t in batch if t not in finished]
+                    
+                    for topic in missing:
+                        attempts[topic] += 1
+                        if attempts[topic] <= MAX_TOPIC_RETRIES:
+                            print(f"   [Requeue] '{topic[:30]}' (attempt {attempts[topic] + 1})")
+                            self.tracer.event("requeue", topic=topic, attempt=attempts[topic] + 1)
+                            queue.append(topic)
+                        else:
+                            print(f"   [Error] Giving up on '{topic[:30]}' for this run (will retry on resume).")
+        finally:
+            # 実行中のワーカーが state / レポートへ書き込み終えるまで待つ (この後 run.close() で閉じるため)
+            executor.shutdown(wait=True, cancel_futures=True)
+        print(f"   [Rate Limit] Total wait across workers: {self.limiter.waited:.1f}s")
+        if exhausted:
+            print("   [Quota] Progress saved. Exiting.")
+        return not exhausted
+
+    def _report_header(self, theme):
         timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
         report = f"# Deep Research Report: {theme}\n"
         report += f"Generated: {timestamp}\n"
         report += f"Model: {self.model_name}\n\n"
         report += "---\n\n"
-        
-        for topic, content in results.items():
-            if content == "See above (Bundled)":
-                continue
-            report += f"## {topic}\n\n{content}\n\n---\n\n"
-            
         return report
 
-    def run(self, theme, output_path=None, use_ai_plan=False):
-        print(f"\n>>> Starting Deep Investigation for: '{theme}'\n")
-        
+    def aggregate_report(self, report, topics):
+        """Phase 3: レポート確定 (完了順に追記したセクションを計画順に並べ替える - API-free)"""
+        print("   [Aggregation] Ordering streamed sections into the final report...")
+        return report.finalize(topics)
+
+    def _open_theme(self, theme, output_path=None, use_ai_plan=False):
+        """テーマの state を読み込む (無ければ計画を立てる) と、レポートの書き出しを開始する"""
         # Resume Manager Init
         safe_theme = "".join([c for c in theme if c.isalnum() or c in (' ', '-', '_')]).strip().replace(' ', '_')
         timestamp = datetime.datetime.now().strftime("%Y%m%d") # 日付単位でセッション管理
         session_id = f"{timestamp}_{safe_theme}"
-        resume_file = f"projects/prosper/investigator/state/{session_id}.json"
+        state_dir = os.path.join(STATE_DIR, DRY_RUN_SUBDIR) if self.dry_run else STATE_DIR
+        store = StateStore(f"{state_dir}/{session_id}.sqlite3", legacy_json=f"{state_dir}/{session_id}.json")
         
-        state = self._load_state(resume_file)
-        if state:
-            print(f"   [Resume] Found saved state from {state['last_updated']}")
-            topics = state['topics']
-            results = state['results']
+        plan = store.load_plan()
+        if plan:
+            _, topics, last_updated = plan
+            print(f"   [Resume] '{theme}': found saved state from {last_updated}")
         else:
             # 1. Plan
-            if use_ai_plan:
-                print("   [Rate Limit] Waiting 15s before Planning (RPM limit 5)...")
-                time.sleep(15)
-            topics = self.plan_research(theme, use_ai=use_ai_plan)
-            results = {} # バンドル単位で保存するため、keyは "Batch X" などになる可能性、あるいは展開して保存
+            with self.tracer.span("plan", "plan", theme=theme, ai=use_ai_plan) as span:
+                topics = self.plan_research(theme, use_ai=use_ai_plan)
+                span["topics"] = len(topics)
             
             # 初期状態保存
-            self._save_state(resume_file, theme, topics, results)
+            store.save_plan(theme, topics)
+        done = store.done_topics()
 
-        # 2. Execute Loop (Bundled)
-        # 未完了のトピックを特定
-        # resultsのキーにトピックが含まれているかで判定...したいがバンドル化するとキーが変わる？
-        # Simplify: resultsには "Topic Name": "Content" で保存し、バンドル処理時に展開して埋める。
+        if not output_path:
+            timestamp_full = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            reports_dir = os.path.join(REPORTS_DIR, DRY_RUN_SUBDIR) if self.dry_run else REPORTS_DIR
+            output_path = f"{reports_dir}/{timestamp_full}_{safe_theme}_DEEP.md"
         
-        pending_topics = [t for t in topics if t not in results]
+        # レポートは完了したセクションから <output>.partial に追記していく (再開時は保存済みの分から)
+        report = ReportWriter(output_path, self._report_header(theme))
+        for topic in topics:
+            if topic in done:
+                content = store.get(topic)
+                if content != "See above (Bundled)":
+                    report.append(topic, content)
+        print(f"   [Report] Streaming sections to: {report.partial_path}")
+        run = ThemeRun(theme, topics, store, report)
+        self._reuse_past_research(run)
+        return run
+
+    def _research_themes(self, runs):
+        """
+        複数テーマの未完了トピックをまとめて調査する。
+        同じトピック (正規化して一致) は1回だけ調査し、結果を該当する全テーマの state / レポートに書く。
+        """
+        owners = {} # topic_key -> [(ThemeRun, そのテーマでのトピック名)]
+        canonical = {} # topic_key -> 調査に使うトピック名
+        for run in runs:
+            for topic in run.pending:
+                key = topic_key(topic)
+                owners.setdefault(key, []).append((run, topic))
+                canonical.setdefault(key, topic)
         
+        pending_topics = list(canonical.values())
+        total = sum(len(o) for o in owners.values())
         if not pending_topics:
             print("   [Resume] All topics properly researched.")
-        else:
-            print(f"   [Progress] {len(results)}/{len(topics)} done. {len(pending_topics)} to go.")
-            
-            # Bundle into chunks of 5 (Aggressive Bundling)
-            BUNDLE_SIZE = 5
-            topic_batches = [pending_topics[i:i + BUNDLE_SIZE] for i in range(0, len(pending_topics), BUNDLE_SIZE)]
-            
-            total_batches = len(topic_batches)
-            
-            for i, batch in enumerate(topic_batches):
-                print(f"   [Batch {i+1}/{total_batches}] Processing {len(batch)} topics: {batch[0][:20]}...")
-                
-                try:
-                    batch_content = self.conduct_bundled_research(batch)
-                    
-                    # Split content or save as is?
-                    # 簡易化のため、バッチ内の各トピックに対して同じ内容(または分割)を割り当てる
-                    # ここではAIに分割出力させるが、パース失敗リスクを避けるため
-                    # 「Batch Content」としてresultsには個別に保存せず、
-                    # results["_BATCH_CONTENT_" + str(uuid)] みたいにするか、
-                    # 単に batch[0] のキーにまとめて入れるか...
-                    # Userへのレポート出力時は results.values() を結合するだけなので、
-                    # results[batch[0]] = batch_content (他のキーは空) とするのがシンプル。
-                    
-                    results[batch[0]] = batch_content 
-                    for other_topic in batch[1:]:
-                        results[other_topic] = "See above (Bundled)" # マーカー
-                        
-                    # Save State
-                    self._save_state(resume_file, theme, topics, results)
-                    
-                except Exception as e:
-                    print(f"   [Error] Batch failed: {e}")
-                    # 429 Errorならここで終了
-                    if "429" in str(e) or "RESOURCE_EXHAUSTED" in str(e):
-                        print("   [Quota] API Limit Reached. Progress saved. Exiting.")
-                        return None
-                    # 他のエラーなら次へ
+            return True
+        if total > len(pending_topics):
+            print(f"   [Dedup] {total} pending topics -> {len(pending_topics)} unique.")
+        print(f"   [Progress] {len(pending_topics)} topics to go.")
         
-        # 3. Aggregate
-        final_report = self.aggregate_report(theme, results)
+        def on_section(topic, body):
+            for run, name in owners[topic_key(topic)]:
+                with self.progress_lock:
+                    run.record(name, body)
+            print(f"   [Section] '{topic[:30]}' written ({len(body)} chars)")
         
-        # Save Report
-        if not output_path:
-            timestamp_full = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_path = f"projects/prosper/investigator/reports/{timestamp_full}_{safe_theme}_DEEP.md"
-            
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(final_report)
-            
-        print(f"\n>>> Investigation Complete!")
-        print(f">>> Report saved to: {output_path}")
-        return output_path
-
-    def _load_state(self, path):
-        if os.path.exists(path):
-            with open(path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return None
+        return self._research_topics(pending_topics, on_section)
+
+    def _finish_theme(self, run):
+        # 3. Aggregate (トピックの計画順にマージ)
+        path = self.aggregate_report(run.report, run.topics)
+        missing = len(run.pending)
+        print(f">>> Report saved to: {path}" + (f" ({missing} topics missing, will retry on resume)" if missing else ""))
+        return path
 
-    def _save_state(self, path, theme, topics, results):
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        state = {
-            "theme": theme,
-            "last_updated": datetime.datetime.now().isoformat(),
-            "topics": topics,
-            "results": results
-        }
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(state, f, ensure_ascii=False, indent=2)
-
-    def conduct_bundled_research(self, topics):
-        """3つのトピックをまとめて調査"""
+    def run(self, theme, output_path=None, use_ai_plan=False):
+        print(f"\n>>> Starting Deep Investigation for: '{theme}'\n")
+        
+        run = self._open_theme(theme, output_path, use_ai_plan)
+        try:
+            # 2. Execute (トピック単位のmap: バンドルで問い合わせ、応答をトピック別に分割して保存)
+            if not self._research_themes([run]):
+                self._print_run_stats()
+                return None
+            self._print_run_stats()
+            print(f"\n>>> Investigation Complete!")
+            return self._finish_theme(run)
+        finally:
+            run.close()
+
+    def run_batch(self, jobs, use_ai_plan=False):
+        """
+        複数テーマを1プロセスで調査する。クライアント・レート制限・キャッシュ・ワーカープールを共有し、
+        テーマ間で重複するトピックは1回だけ調査する。state はテーマごとに保存する。
+        戻り値: {theme: レポートのパス or None}
+        """
+        print(f"\n>>> Starting Batch Investigation: {len(jobs)} themes\n")
+        
+        # 計画 (AI計画の場合もAPI呼び出しは共有のレート制限を通る)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            runs = list(executor.map(
+                lambda job: self._open_theme(job["theme"], job.get("output"), job.get("ai_plan", use_ai_plan)),
+                jobs,
+            ))
+        
+        outputs = {run.theme: None for run in runs}
+        try:
+            completed = self._research_themes(runs)
+            self._print_run_stats()
+            if not completed:
+                print("\n>>> Batch stopped by quota. Progress saved per theme; rerun to resume.")
+                return outputs
+            print(f"\n>>> Batch Complete!")
+            for run in runs:
+                outputs[run.theme] = self._finish_theme(run)
+            return outputs
+        finally:
+            for run in runs:
+                run.close()
+
+    def _print_run_stats(self):
+        if self.cache:
+            print(f"   [Cache] {self.cache.summary()}")
+        usage = self.scheduler.summary() if self.scheduler else None
+        if usage:
+            print(usage)
+        print(self.tracer.summary())
+
+    def conduct_bundled_research(self, topics, on_chunk=None):
+        """複数のトピックをまとめて調査 (応答は topic_pipeline.SectionStream でトピック別に分割する)"""
         topics_str = "\n".join([f"- {t}" for t in topics])
         print(f"   [Researching] Bundled bundle...")
         
         if self.dry_run:
             print("      [Dry Run] Skipping API call. Returning mock content.")
-            return f"# Bundled Content for {topics[0]}...\n(Mock Data)\n\n# {topics[1] if len(topics)>1 else 'T2'}...\n(Mock Data)"
+            content = "\n\n".join(f"# {t}\n(Mock Data)" for t in topics)
+            if on_chunk:
+                on_chunk(content)
+            return content
 
         prompt = f"""
         あなたは執筆者のために「生の素材」を集める調査員です。
@@ -331,7 +682,8 @@ class ProsperInvestigator:
         
         [INSTRUCTIONS]
         1. Use Google Search to find detailed facts for EACH topic.
-        2. Output Format:
+        2. Output Format: start each topic's section with a level-1 heading that repeats the topic EXACTLY as listed,
+           and use only ## or deeper headings inside a section (the response is split by these headings):
            # {topics[0]}
            (Details...)
            
@@ -341,14 +693,11 @@ class ProsperInvestigator:
         3. Do NOT Summarize. Raw data needed.
         """
         
-        # Rate Limit
-        print("      [Rate Limit] Waiting 15s...")
-        time.sleep(15)
-        
         try:
             response = self._generate_with_fallback(
                 contents=prompt,
-                use_tools=True
+                use_tools=True,
+                on_chunk=on_chunk
             )
             return response.text
         except Exception as e:
@@ -357,14 +706,47 @@ class ProsperInvestigator:
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Prosper Investigator V3 (Deep Dive Mode)")
     parser.add_argument("theme", nargs="?", help="Theme to investigate")
+    parser.add_argument("--batch", help="File of themes to investigate together (one per line, or JSONL with theme/output/ai_plan)")
     parser.add_argument("--output", help="Output file path (optional)")
     parser.add_argument("--list-models", action="store_true", help="List available models")
     parser.add_argument("--dry-run", action="store_true", help="Run without calling API")
     parser.add_argument("--model", help="Specify model name (e.g. gemini-2.5-flash-lite)")
     parser.add_argument("--ai-plan", action="store_true", help="Use AI for planning topics (consumes API quota)")
+    parser.add_argument("--concurrency", type=int, default=3, help="Number of batches researched in parallel")
+    parser.add_argument("--rpm", type=int, help="Requests per minute per model (default: free-tier limits)")
+    parser.add_argument("--tpm", type=int, help="Tokens per minute per model (default: free-tier limits)")
+    parser.add_argument("--max-cooldown-wait", type=float, default=MAX_COOLDOWN_WAIT,
+                        help="Seconds to wait for a rate-limited key/model to recover before giving up")
+    parser.add_argument("--reuse", action="store_true",
+                        help="Reuse the plan and sections of past research on the same theme instead of re-researching them")
+    parser.add_argument("--reuse-days", type=float, default=REUSE_DAYS,
+                        help="With --reuse, only consider reports/state newer than this many days")
+    parser.add_argument("--reuse-threshold", type=float, default=REUSE_THRESHOLD, help="Similarity needed to reuse a past section")
+    parser.add_argument("--reuse-theme-threshold", type=float, default=REUSE_THEME_THRESHOLD,
+                        help="Theme similarity a past report/state needs before its plan or sections are considered")
+    parser.add_argument("--startup-time", action="store_true", help="Print how long startup took (imports + setup) and exit")
+    parser.add_argument("--trace", help="Write timing spans to this file (.json = Chrome trace, otherwise JSONL)")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the LLM response cache")
+    parser.add_argument("--cache-only", action="store_true", help="Replay from the response cache only (no API calls)")
+    parser.add_argument("--cache-ttl-days", type=float, default=DEFAULT_TTL_DAYS, help="Cache entry lifetime in days")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_MAX_MB, help="Cache size limit (LRU eviction)")
     args = parser.parse_args()
     
-    investigator = ProsperInvestigator(model_name=args.model)
+    investigator = ProsperInvestigator(
+        model_name=args.model, concurrency=args.concurrency, rpm=args.rpm, tpm=args.tpm,
+        cache_path=None if args.no_cache else CACHE_PATH, cache_only=args.cache_only,
+        cache_ttl_days=args.cache_ttl_days, cache_max_mb=args.cache_max_mb,
+        max_cooldown_wait=args.max_cooldown_wait,
+        reuse_days=args.reuse_days if args.reuse else 0, reuse_threshold=args.reuse_threshold,
+        reuse_theme_threshold=args.reuse_theme_threshold,
+        # --startup-time はセットアップだけ測って終わるので、キーが無くても動くようオフライン扱いにする
+        trace_path=args.trace, dry_run=args.dry_run or args.startup_time,
+    )
+
+    if args.startup_time:
+        sdk = "loaded" if genai else "not loaded"
+        print(f"   [Startup] Ready in {time.perf_counter() - _STARTED:.3f}s (google.genai {sdk})")
+        exit(0)
 
     if args.list_models:
         print(">>> Listing available models...")
@@ -372,10 +754,12 @@ if __name__ == "__main__":
             print(f" - {m.name}")
         exit(0)
 
-    if not args.theme:
-        print("Error: Theme is required unless --list-models is used.")
+    if not args.theme and not args.batch:
+        print("Error: Theme (or --batch) is required unless --list-models is used.")
         exit(1)
 
-    # Dry Run設定の注入
-    investigator.dry_run = args.dry_run
-    investigator.run(args.theme, args.output, use_ai_plan=args.ai_plan)
+    if args.batch:
+        investigator.run_batch(load_batch_jobs(args.batch), use_ai_plan=args.ai_plan)
+    else:
+        investigator.run(args.theme, args.output, use_ai_plan=args.ai_plan)
+    investigator.tracer.close()
@@ -0,0 +1,136 @@
+import os
+import time
+import threading
+
+# フォールバックモデルを1段下げるごとに許容する待ち時間（秒）。
+# 優先モデルの待ちがこれより短ければ優先モデルを待つ。
+FALLBACK_PENALTY = 20.0
+# 429でRetry-Afterが分からない場合のクールダウン（連続するごとに倍、上限あり）
+BASE_COOLDOWN = 60.0
+MAX_COOLDOWN = 3600.0
+
+
+class QuotaExhausted(Exception):
+    """全てのキー×モデルがクールダウン中で、待てる時間内に回復しない"""
+
+
+def load_api_keys():
+    """GEMINI_API_KEYS (カンマ区切り) / GEMINI_API_KEY / GOOGLE_API_KEY から重複なくキーを集める"""
+    keys = [k.strip() for k in os.getenv("GEMINI_API_KEYS", "").split(",")]
+    keys += [os.getenv("GEMINI_API_KEY", ""), os.getenv("GOOGLE_API_KEY", "")]
+    return list(dict.fromkeys(k for k in keys if k))
+
+
+class Slot:
+    """1つの (APIキー, モデル) の組のクォータ状態"""
+
+    def __init__(self, key_index, key, model, rank):
+        self.key_index = key_index
+        self.key = key
+        self.model = model
+        self.rank = rank # model_candidates 内の順位 (0 = 優先モデル)
+        self.cooldown_until = 0.0
+        self.consecutive_429 = 0
+        self.requests = 0
+        self.tokens = 0
+        self.rate_limited = 0
+
+    @property
+    def name(self):
+        return f"key#{self.key_index + 1}(...{self.key[-4:]})/{self.model.replace('models/', '')}"
+
+    def cooldown_left(self, now):
+        return max(0.0, self.cooldown_until - now)
+
+
+class QuotaScheduler:
+    """
+    複数のAPIキー×モデルにリクエストを振り分ける（_switch_model の置き換え）。
+    - 各組のクォータ状態を 429 / Retry-After / 応答ヘッダから更新し、回復時刻を過ぎたら自動的に復帰
+    - 選択は「RateLimiterでの待ち時間 + フォールバック順位のペナルティ」が最小の組
+    - 全ての組がクールダウン中なら、最も早い回復を max_wait 秒まで待つ
+    """
+
+    def __init__(self, keys, models, limiter, max_wait=300.0, tracer=None):
+        if not keys:
+            raise ValueError("API Key not found in .env (GEMINI_API_KEY or GOOGLE_API_KEY)")
+        self.limiter = limiter
+        self.max_wait = max_wait
+        self.slots = [Slot(i, key, model, rank)
+                      for rank, model in enumerate(models)
+                      for i, key in enumerate(keys)]
+        self.lock = threading.Lock()
+        self.last_choice = None
+        self.tracer = tracer
+
+    def choose(self, est_tokens):
+        """次のリクエストを出す組を選ぶ。全滅していれば回復まで待つか QuotaExhausted"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                ready = [s for s in self.slots if s.cooldown_left(now) == 0]
+                if ready:
+                    slot = min(ready, key=lambda s: (
+                        self.limiter.estimate_wait(s.model, est_tokens, key=s.key_index) + s.rank * FALLBACK_PENALTY,
+                        s.rank,
+                        s.requests,
+                    ))
+                    if self.last_choice and slot.rank != self.last_choice.rank:
+                        direction = "Falling back to" if slot.rank > self.last_choice.rank else "Recovered"
+                        print(f"   [Scheduler] {direction} {slot.name}")
+                        if self.tracer:
+                            self.tracer.event("model_switch", slot=slot.name, direction=direction)
+                    self.last_choice = slot
+                    return slot
+                wait = min(s.cooldown_left(now) for s in self.slots)
+            if wait > self.max_wait:
+                raise QuotaExhausted(f"RESOURCE_EXHAUSTED: all keys/models cooling down (next recovery in {wait:.0f}s)")
+            print(f"   [Scheduler] All keys/models cooling down. Waiting {wait:.0f}s for the next recovery...")
+            time.sleep(wait)
+            if self.tracer:
+                self.tracer.add_wait("cooldown_wait", wait)
+
+    def record_success(self, slot, tokens=None, headers=None):
+        with self.lock:
+            slot.requests += 1
+            slot.tokens += tokens or 0
+            slot.consecutive_429 = 0
+            # 残りリクエスト数を返すヘッダがあれば、使い切った時点でリセットまで休ませる
+            if headers:
+                remaining = headers.get("x-ratelimit-remaining-requests")
+                reset = headers.get("x-ratelimit-reset-requests")
+                if remaining == "0" and reset:
+                    try:
+                        slot.cooldown_until = time.monotonic() + float(str(reset).rstrip("s"))
+                    except ValueError:
+                        pass
+
+    def record_429(self, slot, retry_after=None):
+        with self.lock:
+            slot.rate_limited += 1
+            slot.consecutive_429 += 1
+            if retry_after is None:
+                retry_after = min(MAX_COOLDOWN, BASE_COOLDOWN * 2 ** (slot.consecutive_429 - 1))
+            slot.cooldown_until = time.monotonic() + retry_after
+        print(f"   [Quota] {slot.name} rate limited. Cooling down {retry_after:.0f}s.")
+        if self.tracer:
+            self.tracer.event("rate_limited", slot=slot.name, cooldown=retry_after)
+
+    def metrics(self):
+        """組ごとの利用状況"""
+        now = time.monotonic()
+        with self.lock:
+            return [{
+                "slot": s.name,
+                "requests": s.requests,
+                "tokens": s.tokens,
+                "rate_limited": s.rate_limited,
+                "cooldown_left": round(s.cooldown_left(now), 1),
+            } for s in self.slots]
+
+    def summary(self):
+        return "\n".join(
+            f"   [Scheduler] {m['slot']}: {m['requests']} req, {m['tokens']} tokens, "
+            f"{m['rate_limited']}x 429" + (f", cooling {m['cooldown_left']:.0f}s" if m["cooldown_left"] else "")
+            for m in self.metrics() if m["requests"] or m["rate_limited"]
+        )
@@ -0,0 +1,135 @@
+import re
+import time
+import threading
+
+# モデルごとの既定クォータ (RPM, TPM)。Free Tier相当の控えめな値。
+# 有料枠のキーでは --rpm / --tpm で上書きする。
+DEFAULT_LIMITS = {
+    "models/gemini-2.5-pro": (5, 250_000),
+    "models/gemini-2.5-flash": (10, 250_000),
+    "models/gemini-2.5-flash-lite": (15, 250_000),
+}
+FALLBACK_LIMIT = (5, 250_000)
+
+_RETRY_DELAY_RE = re.compile(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s")
+
+
+def estimate_tokens(text):
+    """プロンプトのトークン数の概算（日本語混じりなので2文字≒1トークンで多めに見積もる）"""
+    return max(1, len(str(text)) // 2)
+
+
+def retry_after_seconds(error):
+    """429エラーから再試行までの秒数を取り出す（Retry-Afterヘッダ or RetryInfo.retryDelay）。不明ならNone"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    match = _RETRY_DELAY_RE.search(str(error))
+    if match:
+        return float(match.group(1))
+    return None
+
+
+class TokenBucket:
+    """1分あたりの上限を連続的に補充するトークンバケット。残量は負（借り越し）になり得る"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        # 上限を超える要求は満タンになるまで待てば通す
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+
+class ModelLimiter:
+    """1モデル分のRPM/TPM制限"""
+
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.cond = threading.Condition()
+
+    def _wait_time(self, est_tokens):
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        return max(self.requests.wait_time(1), self.tokens.wait_time(est_tokens))
+
+    def estimate_wait(self, est_tokens):
+        """今acquireしたら何秒待つか（消費はしない）"""
+        with self.cond:
+            return self._wait_time(est_tokens)
+
+    def acquire(self, est_tokens):
+        """枠が空くまで待ってから1リクエスト分を消費する。待った秒数を返す"""
+        started = time.monotonic()
+        with self.cond:
+            while True:
+                wait = self._wait_time(est_tokens)
+                if wait <= 0:
+                    self.requests.tokens -= 1
+                    self.tokens.tokens -= est_tokens
+                    return time.monotonic() - started
+                self.cond.wait(wait)
+
+    def settle(self, est_tokens, actual_tokens):
+        """実際の使用トークン数で見積もりとの差分を精算する"""
+        with self.cond:
+            self.tokens.tokens -= actual_tokens - est_tokens
+            self.cond.notify_all()
+
+
+class RateLimiter:
+    """(APIキー, モデル名) -> ModelLimiter。スレッド間で共有する"""
+
+    def __init__(self, rpm=None, tpm=None, limits=None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.models = {}
+        self.lock = threading.Lock()
+        self.waited = 0.0
+        self.local = threading.local() # スレッドごとの累計待ち時間
+
+    def for_model(self, model, key=0):
+        with self.lock:
+            if (key, model) not in self.models:
+                rpm, tpm = self.limits.get(model, FALLBACK_LIMIT)
+                self.models[(key, model)] = ModelLimiter(self.rpm or rpm, self.tpm or tpm)
+            return self.models[(key, model)]
+
+    def estimate_wait(self, model, est_tokens, key=0):
+        return self.for_model(model, key).estimate_wait(est_tokens)
+
+    def acquire(self, model, est_tokens, key=0):
+        waited = self.for_model(model, key).acquire(est_tokens)
+        if waited >= 0.5:
+            print(f"      [Rate Limit] key#{key + 1}/{model}: waited {waited:.1f}s")
+        with self.lock:
+            self.waited += waited
+        self.local.waited = self.thread_waited() + waited
+        return waited
+
+    def thread_waited(self):
+        """呼び出し元スレッドがこれまでにレート制限で待った秒数"""
+        return getattr(self.local, "waited", 0.0)
+
+    def settle(self, model, est_tokens, actual_tokens, key=0):
+        if actual_tokens:
+            self.for_model(model, key).settle(est_tokens, actual_tokens)
@@ -0,0 +1,57 @@
+import os
+import threading
+
+PARTIAL_SUFFIX = ".partial"
+
+
+class ReportWriter:
+    """
+    レポートをトピックの完了順に <output>.partial へ追記し、最後に計画順へ並べ替えて <output> に確定する。
+    - 追記ごとにflushするので、後段（publisher等）は完了済みのセクションを先に読み始められる
+    - 並べ替えは各セクションのバイト位置から1つずつ読み書きするため、全文をメモリに持たない
+    """
+
+    def __init__(self, path, header):
+        self.path = path
+        self.partial_path = path + PARTIAL_SUFFIX
+        self.offsets = {}  # topic -> (開始バイト位置, バイト長)
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.header = header.encode("utf-8")
+        self.f = open(self.partial_path, "wb")
+        self.f.write(self.header)
+        self.f.flush()
+
+    def append(self, topic, content):
+        """1トピック分のセクションを追記する（同じトピックは1回だけ）"""
+        section = f"## {topic}\n\n{content}\n\n---\n\n".encode("utf-8")
+        with self.lock:
+            if topic in self.offsets:
+                return
+            self.offsets[topic] = (self.f.tell(), len(section))
+            self.f.write(section)
+            self.f.flush()
+
+    def finalize(self, topics):
+        """計画順に並べ替えたレポートを書き出し、.partial を削除する"""
+        with self.lock:
+            self.f.close()
+            order = [t for t in topics if t in self.offsets]
+            order += [t for t in self.offsets if t not in order]
+            tmp_path = self.path + ".tmp"
+            with open(self.partial_path, "rb") as src, open(tmp_path, "wb") as dst:
+                dst.write(self.header)
+                for topic in order:
+                    start, length = self.offsets[topic]
+                    src.seek(start)
+                    dst.write(src.read(length))
+            os.replace(tmp_path, self.path)
+            os.remove(self.partial_path)
+        return self.path
+
+    def close(self):
+        """中断時: .partial を残したまま閉じる"""
+        with self.lock:
+            if not self.f.closed:
+                self.f.close()
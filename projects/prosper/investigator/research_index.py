@@ -0,0 +1,167 @@
+import os
+import re
+import glob
+import json
+import math
+import time
+import sqlite3
+import unicodedata
+from collections import Counter
+
+# 過去のレポート・stateを、テーマ+トピック名の文字bigram TF-IDFで索引する（外部サービス不要）
+_REPORT_THEME_RE = re.compile(r'^# Deep Research Report:\s*(.+)$', re.MULTILINE)
+_SECTION_RE = re.compile(r'^## (.+)$', re.MULTILINE)
+_SKIP_CHARS_RE = re.compile(r'[\s\W_]+')
+# --dry-run の本文 (索引しない)
+_MOCK_BODY = "(Mock Data)"
+# 再利用しないプレースホルダ本文
+_SKIP_BODIES = {"See above (Bundled)", _MOCK_BODY}
+
+
+def _grams(text):
+    norm = _SKIP_CHARS_RE.sub("", unicodedata.normalize("NFKC", text).lower())
+    if len(norm) < 2:
+        return Counter([norm]) if norm else Counter()
+    return Counter(norm[i:i + 2] for i in range(len(norm) - 1))
+
+
+def _report_sections(path):
+    """レポートを (theme, [(topic, 本文)]) に分解する"""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    m = _REPORT_THEME_RE.search(text)
+    theme = m.group(1).strip() if m else os.path.basename(path)
+    sections = []
+    headings = list(_SECTION_RE.finditer(text))
+    for i, h in enumerate(headings):
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(text)
+        body = text[h.end():end].strip()
+        body = re.sub(r'\n---\s*$', '', body).strip()
+        if body and body not in _SKIP_BODIES:
+            sections.append((h.group(1).strip(), body))
+    return theme, sections
+
+
+def _state_sections(path):
+    """state (SQLite) を (theme, [(topic, 本文)]) に分解する"""
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        row = db.execute("SELECT theme FROM plan WHERE id = 1").fetchone()
+        rows = db.execute("SELECT topic, content FROM results").fetchall()
+    except sqlite3.DatabaseError:
+        return None, []
+    finally:
+        db.close()
+    return (row[0] if row else None), [(t, c) for t, c in rows if c and c not in _SKIP_BODIES]
+
+
+class ResearchIndex:
+    """
+    reports/*.md と state/*.sqlite3 の各セクションを索引し、近いテーマで新しいトピックに近い過去の調査を探す。
+    - テーマ同士の類似度 (テーマだけのbigramベクトルのcos) が theme_threshold 未満の調査は候補にしない
+    - ファイルのmtimeで差分更新し、索引はJSONで保存する
+    - 本文は索引に持たず、再利用するときだけ元ファイルから読む
+    """
+
+    def __init__(self, index_path, reports_dir, state_dir):
+        self.index_path = index_path
+        self.reports_dir = reports_dir
+        self.state_dir = state_dir
+        self.files = {}  # path -> mtime
+        self.docs = []   # {"source", "theme", "topic", "mtime", "grams"}
+        self.idf = {}
+        if os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.docs = data.get("docs", [])
+
+    def refresh(self):
+        """変更・追加・削除されたファイルだけを索引し直す"""
+        current = {}
+        for path in glob.glob(os.path.join(self.reports_dir, "*.md")) + glob.glob(os.path.join(self.state_dir, "*.sqlite3")):
+            current[path] = os.path.getmtime(path)
+        changed = {p for p, mtime in current.items() if self.files.get(p) != mtime}
+        removed = set(self.files) - set(current)
+        if changed or removed:
+            self.docs = [d for d in self.docs if d["source"] not in changed | removed]
+            for path in sorted(changed):
+                theme, sections = _report_sections(path) if path.endswith(".md") else _state_sections(path)
+                for topic, _ in sections:
+                    self.docs.append({
+                        "source": path,
+                        "theme": theme or "",
+                        "topic": topic,
+                        "mtime": current[path],
+                        "grams": _grams(f"{theme or ''} {topic}"),
+                    })
+            self.files = current
+            os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                docs = [{k: v for k, v in d.items() if not k.startswith("_")} for d in self.docs]
+                json.dump({"files": self.files, "docs": docs}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+            print(f"   [Index] Updated: {len(changed)} files re-indexed, {len(self.docs)} sections total")
+        self._compute_idf()
+
+    def _compute_idf(self):
+        df = Counter()
+        for doc in self.docs:
+            df.update(doc["grams"].keys())
+        n = len(self.docs)
+        self.idf = {g: math.log((1 + n) / (1 + c)) + 1 for g, c in df.items()}
+        for doc in self.docs:
+            doc["_vec"], doc["_norm"] = self._vector(doc["grams"])
+
+    def _vector(self, grams):
+        n = len(self.docs)
+        default_idf = math.log(1 + n) + 1 # 索引に無いgram
+        vec = {g: tf * self.idf.get(g, default_idf) for g, tf in grams.items()}
+        return vec, math.sqrt(sum(v * v for v in vec.values())) or 1.0
+
+    def theme_similarity(self, theme, other):
+        """テーマ同士の類似度 (テーマ名だけのbigram TF-IDFのcos)"""
+        vec, norm = self._vector(_grams(theme))
+        other_vec, other_norm = self._vector(_grams(other))
+        return sum(w * other_vec.get(g, 0.0) for g, w in vec.items()) / (norm * other_norm)
+
+    def _close_themes(self, theme, theme_threshold):
+        """索引中のテーマのうち theme に十分近いもの -> 類似度"""
+        themes = {d["theme"] for d in self.docs}
+        scores = {t: self.theme_similarity(theme, t) for t in themes}
+        return {t: score for t, score in scores.items() if score >= theme_threshold}
+
+    def search(self, theme, topic, theme_threshold, max_age_days=None, limit=1):
+        """近いテーマの過去のセクションを、テーマ+トピックに近い順に [(score, doc)] で返す"""
+        vec, norm = self._vector(_grams(f"{theme} {topic}"))
+        oldest = time.time() - max_age_days * 86400 if max_age_days is not None else 0
+        themes = self._close_themes(theme, theme_threshold)
+        scored = []
+        for doc in self.docs:
+            if doc["mtime"] < oldest or doc["theme"] not in themes:
+                continue
+            dot = sum(w * doc["_vec"].get(g, 0.0) for g, w in vec.items())
+            scored.append((dot / (norm * doc["_norm"]), doc))
+        scored.sort(key=lambda x: x[0], reverse=True)
+        return scored[:limit]
+
+    def theme_topics(self, theme, max_age_days, theme_threshold):
+        """最も近い過去テーマ (同点なら新しい方) の調査のトピック一覧（計画の再利用用）。無ければNone"""
+        oldest = time.time() - max_age_days * 86400
+        themes = self._close_themes(theme, theme_threshold)
+        docs = [d for d in self.docs if d["mtime"] >= oldest and d["theme"] in themes]
+        if not docs:
+            return None
+        best = max(docs, key=lambda d: (themes[d["theme"]], d["mtime"]))
+        old_theme = best["theme"]
+        topics = [d["topic"] for d in self.docs if d["source"] == best["source"]]
+        print(f"   [Index] Reusing plan of '{old_theme}' from {os.path.basename(best['source'])} "
+              f"(theme similarity {themes[old_theme]:.2f})")
+        # トピック名に含まれる過去のテーマ表記は、今回のテーマに置き換える
+        return [t.replace(old_theme, theme) for t in topics] if old_theme != theme else topics
+
+    def load_content(self, doc):
+        """索引したセクションの本文を元ファイルから読む"""
+        _, sections = _report_sections(doc["source"]) if doc["source"].endswith(".md") else _state_sections(doc["source"])
+        return next((body for topic, body in sections if topic == doc["topic"]), None)
@@ -0,0 +1,115 @@
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+DEFAULT_TTL_DAYS = 7
+DEFAULT_MAX_MB = 200
+
+
+class CacheMiss(Exception):
+    """--cache-only でキャッシュに無いリクエストが来た"""
+
+
+class TextResponse:
+    """キャッシュから復元した応答やストリーミングの結果。呼び出し側が使う .text と .usage_metadata だけを持つ"""
+
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+        self.candidates = []
+
+
+def request_key(model, contents, config=None):
+    """(model, contents, config) の内容ハッシュ"""
+    raw = json.dumps({"model": model, "contents": contents, "config": config},
+                     ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    LLM応答の内容アドレス型キャッシュ (SQLite)。
+    - TTL切れのエントリは読み出し時に削除
+    - 合計サイズが上限を超えたら最終アクセスの古い順に削除 (LRU)
+    - スレッド間で1接続を共有する
+    """
+
+    def __init__(self, path, ttl_days=DEFAULT_TTL_DAYS, max_mb=DEFAULT_MAX_MB):
+        self.path = path
+        self.ttl = ttl_days * 86400
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                text TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self.db.commit()
+
+    def get(self, key):
+        """キャッシュ済みのテキストを返す。無い・期限切れならNone"""
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT text, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] > self.ttl:
+                self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.db.commit()
+                self.stats["expired"] += 1
+                row = None
+            if not row:
+                self.stats["misses"] += 1
+                return None
+            self.db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.db.commit()
+            self.stats["hits"] += 1
+            return row[0]
+
+    def put(self, key, model, text):
+        if not text:
+            return
+        now = time.time()
+        size = len(text.encode("utf-8"))
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, text, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, text, size, now, now),
+            )
+            self.stats["stores"] += 1
+            self._evict()
+            self.db.commit()
+
+    def _evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            if total <= self.max_bytes:
+                break
+            self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            self.stats["evictions"] += 1
+
+    def summary(self):
+        with self.lock:
+            count, total = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.stats["hits"] + self.stats["misses"]
+        rate = self.stats["hits"] / lookups if lookups else 0.0
+        return (f"hits {self.stats['hits']} / misses {self.stats['misses']} ({rate:.0%}), "
+                f"stored {self.stats['stores']}, evicted {self.stats['evictions']}, expired {self.stats['expired']}, "
+                f"{count} entries / {total / 1024 / 1024:.1f}MB")
+
+    def close(self):
+        with self.lock:
+            self.db.close()
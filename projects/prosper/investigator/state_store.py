@@ -0,0 +1,70 @@
+import os
+import json
+import sqlite3
+import datetime
+import threading
+
+
+class StateStore:
+    """
+    1テーマ分の再開用state (SQLite, WALモード)。
+    - 計画 (theme / topics) と、トピックごとの結果を別レコードとして保存する
+    - 書き込みはトピック単位のトランザクションなので、途中でクラッシュしても既存の結果は壊れない
+    - 再開時は完了済みトピック名だけを読み、本文は必要になったときに1件ずつ読む
+    旧形式の {session}.json があれば初回オープン時に取り込む。
+    """
+
+    def __init__(self, path, legacy_json=None):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS plan (id INTEGER PRIMARY KEY CHECK (id = 1), theme TEXT, topics TEXT, updated TEXT)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS results (topic TEXT PRIMARY KEY, content TEXT NOT NULL, updated TEXT NOT NULL)")
+        self.db.commit()
+
+        if legacy_json and os.path.exists(legacy_json) and self.load_plan() is None:
+            self._import_legacy(legacy_json)
+
+    def _import_legacy(self, path):
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        self.save_plan(state["theme"], state["topics"])
+        for topic, content in state.get("results", {}).items():
+            self.put(topic, content)
+        print(f"   [State] Imported legacy state: {path}")
+
+    def load_plan(self):
+        """(theme, topics, last_updated)。未保存ならNone"""
+        with self.lock:
+            row = self.db.execute("SELECT theme, topics, updated FROM plan WHERE id = 1").fetchone()
+            if not row:
+                return None
+            last = self.db.execute("SELECT MAX(updated) FROM results").fetchone()[0]
+        return row[0], json.loads(row[1]), max(row[2], last or "")
+
+    def save_plan(self, theme, topics):
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO plan (id, theme, topics, updated) VALUES (1, ?, ?, ?)",
+                            (theme, json.dumps(topics, ensure_ascii=False), datetime.datetime.now().isoformat()))
+
+    def done_topics(self):
+        with self.lock:
+            return {row[0] for row in self.db.execute("SELECT topic FROM results")}
+
+    def get(self, topic):
+        with self.lock:
+            row = self.db.execute("SELECT content FROM results WHERE topic = ?", (topic,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, topic, content):
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO results (topic, content, updated) VALUES (?, ?, ?)",
+                            (topic, content, datetime.datetime.now().isoformat()))
+
+    def close(self):
+        with self.lock:
+            self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.db.close()
@@ -0,0 +1,114 @@
+import re
+import difflib
+
+# バンドル調査の応答を「# トピック名」見出しでトピック別に切り分ける
+_HEADING_RE = re.compile(r'^#\s+(.+?)\s*#*\s*$')
+_NUMBERING_RE = re.compile(r'^(?:\d+[.)、]\s*|topic\s*\d+\s*[:：]\s*)', re.IGNORECASE)
+
+
+def _normalize(text):
+    text = text.replace("**", "").replace("`", "").strip()
+    return _NUMBERING_RE.sub("", text).strip().lower()
+
+
+def match_topic(heading, topics, threshold=0.75):
+    """見出し文字列に対応するトピックを返す（完全一致 -> 類似度）。無ければNone"""
+    norm = _normalize(heading)
+    for topic in topics:
+        if _normalize(topic) == norm:
+            return topic
+    best, best_ratio = None, threshold
+    for topic in topics:
+        ratio = difflib.SequenceMatcher(None, _normalize(topic), norm).ratio()
+        if ratio >= best_ratio:
+            best, best_ratio = topic, ratio
+    return best
+
+
+class SectionStream:
+    """
+    ストリーミング応答を受け取りながらトピック別に切り分ける。
+    次のトピック見出しが来た時点（または close 時）で、直前のトピックの本文を on_section(topic, body) に渡す。
+    トピックに対応しない「# 」見出しは本文として扱う。本文が空のトピックは渡さない。
+    """
+
+    def __init__(self, topics, on_section=None):
+        self.topics = topics
+        self.on_section = on_section
+        self.sections = {}  # 確定したトピック -> 本文
+        self.current = None
+        self.lines = []
+        self.preamble = []
+        self.buffer = ""
+
+    def feed(self, chunk):
+        self.buffer += chunk or ""
+        *complete, self.buffer = self.buffer.split("\n")
+        for line in complete:
+            self._line(line)
+
+    def _line(self, line):
+        m = _HEADING_RE.match(line)
+        topic = match_topic(m.group(1), self.topics) if m else None
+        if topic and topic not in self.sections and topic != self.current:
+            self._emit()
+            self.current = topic
+            return
+        (self.lines if self.current else self.preamble).append(line)
+
+    def _emit(self):
+        if self.current:
+            body = "\n".join(self.lines).strip()
+            if body:
+                self.sections[self.current] = body
+                if self.on_section:
+                    self.on_section(self.current, body)
+        self.current = None
+        self.lines = []
+
+    def close(self):
+        if self.buffer:
+            self._line(self.buffer)
+            self.buffer = ""
+        # 1トピックだけのバンドルで見出しが無い場合は全文をそのトピックとみなす
+        if len(self.topics) == 1 and not self.current and not self.sections:
+            self.current = self.topics[0]
+            self.lines = self.preamble
+        self._emit()
+        return self.sections
+
+
+def split_bundled(text, topics):
+    """
+    バンドル応答をトピック別の本文に分割する。
+    見つからなかったトピックは結果に含めない。
+    """
+    stream = SectionStream(topics)
+    stream.feed(text or "")
+    return stream.close()
+
+
+class AdaptiveBundler:
+    """
+    1リクエストにまとめるトピック数を実測で調整する。
+    - 失敗・分割漏れ、または応答が遅すぎる -> 小さくする
+    - レート制限待ちが長い（クォータ律速）、または応答が十分速い -> 大きくしてリクエスト数を減らす
+    """
+
+    def __init__(self, initial=5, minimum=1, maximum=8, target_latency=90.0):
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+
+    def record(self, batch_size, elapsed, waited, complete):
+        before = self.size
+        if not complete:
+            self.size = max(self.minimum, min(self.size, batch_size) // 2)
+        elif elapsed - waited > self.target_latency:
+            self.size = max(self.minimum, self.size - 1)
+        elif waited > (elapsed - waited) or elapsed < self.target_latency / 3:
+            self.size = min(self.maximum, self.size + 1)
+        if self.size != before:
+            print(f"   [Bundle] Size {before} -> {self.size} "
+                  f"(last: {batch_size} topics, {elapsed:.1f}s incl. {waited:.1f}s rate-limit wait)")
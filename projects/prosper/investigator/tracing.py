@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+# 待ち時間として集計するカテゴリ（それ以外は作業時間）
+WAIT_CATEGORIES = ("wait",)
+
+
+class Tracer:
+    """
+    調査ループの計測スパンを記録する。
+    - path が .json なら Chrome trace (chrome://tracing / Perfetto で開ける)、それ以外はJSONL
+    - イベントは発生時に1行ずつ追記するのでメモリに溜めない（path=None なら集計のみ）
+    - 終了時の summary() で、API呼び出し・待ち・トークン数の内訳を返す
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.chrome = bool(path) and path.endswith(".json")
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+        self.totals = defaultdict(float)  # カテゴリ -> 秒 (全スレッドの合計)
+        self.counts = defaultdict(int)    # イベント名 -> 回数
+        self.tokens = defaultdict(lambda: defaultdict(int)) # モデル -> {prompt, output, total}
+        self.f = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.f = open(path, "w", encoding="utf-8")
+            if self.chrome:
+                # JSON Array Format: 閉じ括弧は省略可能なので、途中で落ちても読める
+                self.f.write("[\n")
+
+    def _write(self, record):
+        if not self.f:
+            return
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        self.f.write(line + (",\n" if self.chrome else "\n"))
+        self.f.flush()
+
+    def _emit(self, name, cat, start, dur, args):
+        thread = threading.current_thread()
+        if self.chrome:
+            record = {"name": name, "cat": cat, "pid": os.getpid(), "tid": thread.ident,
+                      "ts": round((start - self.started) * 1e6), "args": args}
+            if dur is None:
+                record.update(ph="i", s="t")
+            else:
+                record.update(ph="X", dur=round(dur * 1e6))
+        else:
+            record = {"name": name, "cat": cat, "thread": thread.name,
+                      "start": round(start - self.started, 4), **args}
+            if dur is not None:
+                record["dur"] = round(dur, 4)
+        with self.lock:
+            self.counts[name] += 1
+            if dur is not None:
+                self.totals[cat] += dur
+            self._write(record)
+
+    @contextmanager
+    def span(self, name, cat, **args):
+        """計測区間。yieldしたdictに後から属性（トークン数など）を追加できる"""
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self._emit(name, cat, start, time.perf_counter() - start, args)
+
+    def event(self, name, cat="event", **args):
+        """瞬間イベント（モデル切り替え、リトライ、キャッシュヒットなど）"""
+        self._emit(name, cat, time.perf_counter(), None, args)
+
+    def add_wait(self, name, seconds, **args):
+        """別の場所で測った待ち時間をスパンとして記録する"""
+        now = time.perf_counter()
+        self._emit(name, "wait", now - seconds, seconds, args)
+
+    def usage(self, model, usage_metadata):
+        """応答の usage_metadata からトークン数を集計し、dictで返す"""
+        counts = {
+            "prompt_tokens": getattr(usage_metadata, "prompt_token_count", None) or 0,
+            "output_tokens": getattr(usage_metadata, "candidates_token_count", None) or 0,
+            "total_tokens": getattr(usage_metadata, "total_token_count", None) or 0,
+        }
+        with self.lock:
+            for k, v in counts.items():
+                self.tokens[model][k] += v
+        return counts
+
+    def summary(self):
+        wall = time.perf_counter() - self.started
+        with self.lock:
+            waited = sum(v for k, v in self.totals.items() if k in WAIT_CATEGORIES)
+            api = self.totals.get("api", 0.0)
+            if waited + api:
+                lines = [f"   [Trace] wall {wall:.1f}s | API {api:.1f}s over {self.counts.get('generate', 0)} calls "
+                         f"| waiting (rate limit / cooldown) {waited:.1f}s | wait share {waited / (waited + api):.0%}"]
+            else:
+                lines = [f"   [Trace] wall {wall:.1f}s | no API calls"]
+            for model, t in self.tokens.items():
+                lines.append(f"   [Trace] {model}: {t['prompt_tokens']} prompt + {t['output_tokens']} output "
+                             f"= {t['total_tokens']} tokens")
+            events = {k: v for k, v in self.counts.items() if k in ("rate_limited", "model_switch", "requeue", "cache_hit")}
+            if events:
+                lines.append("   [Trace] " + ", ".join(f"{k} x{v}" for k, v in events.items()))
+        if self.path:
+            lines.append(f"   [Trace] Spans written to: {self.path}")
+        return "\n".join(lines)
+
+    def close(self):
+        with self.lock:
+            if self.f:
+                self.f.close()
+                self.f = None
@@ -0,0 +1,180 @@
+"""
+Prosper Publisher Bench
+=======================
+note.comに接続せず、ローカルのエディタ代役（bench/note_editor_stub.html）に対して
+prosper_publisher.py の投稿処理を実行し、スループットを計測する。
+- https://note.com/notes/new と POST /api/upload を page.route で代役に差し替え
+- 記事ごと・待機モードごとに ブロック/秒、ブロック種別ごとの時間、総時間 を表示
+- --json で結果を保存、--baseline で前回結果と比較して劣化を検出（終了コード1）
+- --render-dir で投稿後のエディタHTMLを保存（オフラインのドライラン描画結果）
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from playwright.async_api import async_playwright
+
+from prosper_publisher import ProsperPublisherV10, NOTE_NEW_URL, INSERT_MODES
+from editor_wait import WAIT_MODES, EDITOR_SELECTOR
+from note_blocks import BLOCK_KINDS
+from image_pipeline import ImagePipeline
+from selector_map import SelectorMap
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROSPER_DIR = os.path.dirname(SCRIPTS_DIR)
+STUB_PATH = os.path.join(SCRIPTS_DIR, "bench", "note_editor_stub.html")
+DEFAULT_ARTICLES = ["article_001_*.md", "test_with_images.md", "test_features.md"]
+
+
+def default_articles():
+    paths = []
+    for pattern in DEFAULT_ARTICLES:
+        paths.extend(sorted(glob.glob(os.path.join(PROSPER_DIR, pattern))))
+    return paths
+
+
+async def install_stub(context, upload_ms, embed_ms):
+    """note.comのエディタURLとアップロードAPIを代役に差し替える"""
+    with open(STUB_PATH, "r", encoding="utf-8") as f:
+        stub_html = f.read()
+
+    async def serve_editor(route):
+        await route.fulfill(status=200, content_type="text/html; charset=utf-8", body=stub_html)
+
+    async def serve_upload(route):
+        await asyncio.sleep(upload_ms / 1000)
+        await route.fulfill(status=200, content_type="application/json", body='{"ok": true}')
+
+    async def block_rest(route):
+        await route.abort()
+
+    # routeは後に登録したものが優先される
+    await context.route("https://note.com/**", block_rest)
+    await context.route(f"{NOTE_NEW_URL}*", serve_editor)
+    await context.route("https://note.com/api/upload", serve_upload)
+    # 埋め込みカード化の遅延は代役ページに直接渡す
+    await context.add_init_script(f"window.__STUB_EMBED_MS = {int(embed_ms)};")
+
+
+async def bench_article(context, path, wait_mode, insert_mode, work_dir, render_dir=None):
+    publisher = ProsperPublisherV10(
+        path, wait_mode=wait_mode, insert_mode=insert_mode, resume=False,
+        state_dir=os.path.join(work_dir, "state"),
+        images=ImagePipeline(os.path.join(work_dir, "image_cache")),
+        selectors=SelectorMap(None),
+    )
+    if not publisher.parse_markdown():
+        return None
+
+    page = await context.new_page()
+    started = time.perf_counter()
+    try:
+        await publisher.publish_to_page(page)
+        wall = time.perf_counter() - started
+        rendered = await page.inner_html(EDITOR_SELECTOR)
+    finally:
+        await page.close()
+
+    if render_dir:
+        os.makedirs(render_dir, exist_ok=True)
+        stem = os.path.splitext(os.path.basename(path))[0]
+        with open(os.path.join(render_dir, f"{stem}.{wait_mode}.{insert_mode}.html"), "w", encoding="utf-8") as f:
+            f.write(rendered)
+
+    blocks = len(publisher.blocks)
+    return {
+        "article": os.path.basename(path),
+        "wait_mode": wait_mode,
+        "insert_mode": insert_mode,
+        "lines": len(publisher.lines),
+        "blocks": blocks,
+        "wall": round(wall, 3),
+        "blocks_per_sec": round(blocks / wall, 2) if wall else 0.0,
+        "per_kind": {
+            kind: {"total": round(publisher.timer.totals[kind], 3), "count": publisher.timer.counts[kind]}
+            for kind in BLOCK_KINDS if kind in publisher.timer.totals
+        },
+    }
+
+
+def print_report(results):
+    print("\n>>> Bench Results")
+    print(f"    {'article':<40} {'wait':<13} {'insert':<6} {'blocks':>6} {'wall[s]':>8} {'blk/s':>7}")
+    for r in results:
+        print(f"    {r['article'][:40]:<40} {r['wait_mode']:<13} {r['insert_mode']:<6} "
+              f"{r['blocks']:>6} {r['wall']:>8.2f} {r['blocks_per_sec']:>7.2f}")
+        kinds = ", ".join(f"{k} {v['total'] / v['count']:.3f}s x{v['count']}" for k, v in r["per_kind"].items())
+        print(f"        per block: {kinds}")
+
+
+def check_baseline(results, baseline_path, tolerance):
+    """前回結果より blocks/sec が tolerance 以上落ちたものを返す"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(r["article"], r["wait_mode"], r["insert_mode"]): r for r in json.load(f)}
+    regressions = []
+    for r in results:
+        base = baseline.get((r["article"], r["wait_mode"], r["insert_mode"]))
+        if base and r["blocks_per_sec"] < base["blocks_per_sec"] * (1 - tolerance):
+            regressions.append((r, base))
+    return regressions
+
+
+async def main(args):
+    articles = args.articles or default_articles()
+    if not articles:
+        print(">>> エラー: ベンチ対象の記事がありません。")
+        return 1
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="prosper_bench_") as work_dir:
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=not args.headed)
+            context = await browser.new_context()
+            await install_stub(context, args.upload_ms, args.embed_ms)
+
+            for wait_mode in args.wait_modes:
+                for insert_mode in args.insert_modes:
+                    for path in articles:
+                        for _ in range(args.repeat):
+                            result = await bench_article(context, path, wait_mode, insert_mode, work_dir, args.render_dir)
+                            if result:
+                                results.append(result)
+            await browser.close()
+
+    print_report(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f">>> 結果を保存しました: {args.json}")
+
+    if args.baseline:
+        regressions = check_baseline(results, args.baseline, args.tolerance)
+        for r, base in regressions:
+            print(f">>> REGRESSION: {r['article']} ({r['wait_mode']}/{r['insert_mode']}): "
+                  f"{base['blocks_per_sec']:.2f} -> {r['blocks_per_sec']:.2f} blk/s")
+        if regressions:
+            return 1
+        print(f">>> ベースライン比較OK (許容 {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark prosper_publisher against a local note editor stand-in")
+    parser.add_argument("articles", nargs="*", help="Articles to publish (default: article_001_*.md, test_with_images.md, test_features.md)")
+    parser.add_argument("--wait-modes", nargs="+", choices=WAIT_MODES, default=["fast"])
+    parser.add_argument("--insert-modes", nargs="+", choices=INSERT_MODES, default=["html"])
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per article")
+    parser.add_argument("--upload-ms", type=int, default=400, help="Simulated upload latency")
+    parser.add_argument("--embed-ms", type=int, default=300, help="Simulated embed card latency")
+    parser.add_argument("--headed", action="store_true", help="Show the browser")
+    parser.add_argument("--json", help="Write results as JSON")
+    parser.add_argument("--baseline", help="Compare against a previous --json result")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed blocks/sec drop vs baseline")
+    parser.add_argument("--render-dir", help="Save the rendered editor HTML per run")
+    sys.exit(asyncio.run(main(parser.parse_args())))
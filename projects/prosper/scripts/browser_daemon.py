@@ -0,0 +1,110 @@
+"""
+Browser Daemon
+==============
+.note_user_data の永続コンテキストを常駐させ、CDPエンドポイントを公開する。
+prosper_publisher.py / debug_selector.py は起動済みのブラウザに接続するため、
+毎回のChromium起動（数秒）が不要になる。
+
+使い方:
+    python browser_daemon.py start [--headless] [--account NAME] [--port 9333]
+    python browser_daemon.py status [--account NAME]
+    python browser_daemon.py stop [--account NAME]
+"""
+
+import os
+import json
+import signal
+import asyncio
+import argparse
+import datetime
+from playwright.async_api import async_playwright
+
+from browser_session import launch_note_context, daemon_info_path, daemon_endpoint, DEFAULT_ACCOUNT
+
+USER_DATA_DIR = "/Users/yukinari/Desktop/antigravity/projects/prosper/.note_user_data"
+DEFAULT_PORT = 9333
+
+
+async def serve(account, port, headless):
+    if daemon_endpoint(account):
+        print(f">>> [Daemon] account={account} は既に起動しています。", flush=True)
+        return
+
+    info_path = daemon_info_path(account)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    async with async_playwright() as p:
+        context = await launch_note_context(
+            p, USER_DATA_DIR, account, headless=headless,
+            extra_args=[f"--remote-debugging-port={port}"],
+        )
+        # ウィンドウを閉じられた場合も終了扱い
+        context.on("close", lambda _: stop.set())
+
+        os.makedirs(os.path.dirname(info_path), exist_ok=True)
+        with open(info_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "account": account,
+                "port": port,
+                "pid": os.getpid(),
+                "headless": headless,
+                "started_at": datetime.datetime.now().isoformat(),
+            }, f, ensure_ascii=False, indent=2)
+
+        print(f">>> [Daemon] 起動完了: http://127.0.0.1:{port} (account={account}, headless={headless})", flush=True)
+        print(">>> [Daemon] Ctrl+C または `browser_daemon.py stop` で終了します。", flush=True)
+        try:
+            await stop.wait()
+        finally:
+            if os.path.exists(info_path):
+                os.remove(info_path)
+            try:
+                await context.close()
+            except Exception:
+                pass
+    print(">>> [Daemon] 終了しました。", flush=True)
+
+
+def status(account):
+    endpoint = daemon_endpoint(account)
+    if endpoint:
+        with open(daemon_info_path(account), "r", encoding="utf-8") as f:
+            info = json.load(f)
+        print(f">>> [Daemon] 稼働中: {endpoint} (pid={info['pid']}, headless={info['headless']}, since {info['started_at']})")
+    else:
+        print(f">>> [Daemon] account={account} のデーモンは起動していません。")
+    return endpoint
+
+
+def stop(account):
+    path = daemon_info_path(account)
+    if not os.path.exists(path):
+        print(f">>> [Daemon] account={account} のデーモンは起動していません。")
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        info = json.load(f)
+    try:
+        os.kill(info["pid"], signal.SIGTERM)
+        print(f">>> [Daemon] 停止を要求しました (pid={info['pid']})")
+    except ProcessLookupError:
+        os.remove(path)
+        print(">>> [Daemon] プロセスが既に存在しないため、接続情報を削除しました。")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm note.com browser for the Prosper scripts")
+    parser.add_argument("command", choices=["start", "status", "stop"])
+    parser.add_argument("--account", default=DEFAULT_ACCOUNT, help="Account (user data dir suffix)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="CDP port")
+    parser.add_argument("--headless", action="store_true", help="Run without a visible window")
+    args = parser.parse_args()
+
+    if args.command == "start":
+        asyncio.run(serve(args.account, args.port, args.headless))
+    elif args.command == "status":
+        status(args.account)
+    else:
+        stop(args.account)
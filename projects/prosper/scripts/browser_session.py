@@ -0,0 +1,97 @@
+"""
+Browser Session
+===============
+note.com用の永続コンテキスト（ログイン情報入り）を用意するヘルパー。
+- browser_daemon.py が起動していれば、そのブラウザにCDPで接続する（起動コストなし）
+- いなければ従来通り launch_persistent_context で起動する
+アカウントごとに別の user_data_dir を使う:
+- default   -> .note_user_data
+- <account> -> .note_user_data_<account>
+"""
+
+import os
+import json
+import urllib.request
+
+# 複数ページを並行操作するとき、背景タブのタイマー間引きで待機が伸びないようにする
+BROWSER_ARGS = [
+    "--start-maximized",
+    "--disable-background-timer-throttling",
+    "--disable-renderer-backgrounding",
+    "--disable-backgrounding-occluded-windows",
+]
+
+DEFAULT_ACCOUNT = "default"
+
+# デーモンの接続情報（projects/prosper/state/browser_daemon_<account>.json）
+DAEMON_STATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "state")
+
+
+def user_data_dir_for(base_dir, account=DEFAULT_ACCOUNT):
+    """アカウント名から永続コンテキストのディレクトリを決める"""
+    if not account or account == DEFAULT_ACCOUNT:
+        return base_dir
+    return f"{base_dir}_{account}"
+
+
+def daemon_info_path(account=DEFAULT_ACCOUNT):
+    return os.path.join(DAEMON_STATE_DIR, f"browser_daemon_{account or DEFAULT_ACCOUNT}.json")
+
+
+def daemon_endpoint(account=DEFAULT_ACCOUNT):
+    """稼働中のデーモンがあればCDPエンドポイントURLを返す"""
+    path = daemon_info_path(account)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        info = json.load(f)
+    endpoint = f"http://127.0.0.1:{info['port']}"
+    try:
+        with urllib.request.urlopen(f"{endpoint}/json/version", timeout=1) as res:
+            res.read()
+    except OSError:
+        return None
+    return endpoint
+
+
+async def launch_note_context(playwright, base_dir, account=DEFAULT_ACCOUNT, headless=False, extra_args=()):
+    """アカウント用の永続コンテキストを起動する"""
+    args = [a for a in BROWSER_ARGS if not (headless and a == "--start-maximized")]
+    return await playwright.chromium.launch_persistent_context(
+        user_data_dir=user_data_dir_for(base_dir, account),
+        headless=headless,
+        args=args + list(extra_args),
+    )
+
+
+class NoteSession:
+    """永続コンテキストと、その後始末の方法（デーモン接続なら切断のみ）"""
+
+    def __init__(self, context, browser=None):
+        self.context = context
+        self.browser = browser # CDP接続時のみ
+
+    @property
+    def attached(self):
+        return self.browser is not None
+
+    async def close(self):
+        if self.attached:
+            # 接続を切るだけ。デーモン側のブラウザとログイン状態はそのまま残る
+            await self.browser.close()
+        else:
+            await self.context.close()
+
+
+async def open_note_context(playwright, base_dir, account=DEFAULT_ACCOUNT, headless=False, attach=True):
+    """デーモンがあれば接続し、なければ起動してNoteSessionを返す"""
+    endpoint = daemon_endpoint(account) if attach else None
+    if endpoint:
+        browser = await playwright.chromium.connect_over_cdp(endpoint)
+        if browser.contexts:
+            print(f">>> [Session] 起動済みブラウザに接続しました: {endpoint} (account={account})", flush=True)
+            return NoteSession(browser.contexts[0], browser)
+        await browser.close()
+
+    context = await launch_note_context(playwright, base_dir, account, headless=headless)
+    return NoteSession(context)
@@ -1,17 +1,62 @@
 
+import os
+import json
 import asyncio
+import argparse
+import datetime
 from playwright.async_api import async_playwright
 
+from browser_session import open_note_context
+from selector_map import UNIQUE_SELECTOR_JS, SCAN_JS, STARTUP_TARGETS, MENU_ITEMS, target_spec
+
 USER_DATA_DIR = "/Users/yukinari/Desktop/antigravity/projects/prosper/.note_user_data"
+SELECTOR_MAP_PATH = "/Users/yukinari/Desktop/antigravity/projects/prosper/state/selector_map.json"
+DOM_SNAPSHOT_PATH = "/Users/yukinari/Desktop/antigravity/projects/prosper/state/dom_snapshot.json"
+
+# 操作対象になりうる要素を1回のevaluateでまとめて取得する（ボタンごとの往復をしない）
+SNAPSHOT_JS = f"""
+() => {{
+    const uniqueSelector = {UNIQUE_SELECTOR_JS};
+    const nodes = document.querySelectorAll('button, textarea, input, [contenteditable="true"], [role="menuitem"]');
+    return Array.from(nodes).map((el, index) => ({{
+        index,
+        tag: el.tagName.toLowerCase(),
+        label: el.getAttribute('aria-label'),
+        text: (el.innerText || '').trim().slice(0, 80),
+        placeholder: el.getAttribute('placeholder'),
+        role: el.getAttribute('role'),
+        visible: el.getClientRects().length > 0,
+        selector: uniqueSelector(el),
+    }}));
+}}
+"""
+
+# 論理名 -> 一意なCSSセレクタ を1回のevaluateで解決する
+RESOLVE_JS = f"""
+(specs) => {{
+    const uniqueSelector = {UNIQUE_SELECTOR_JS};
+    const scan = {SCAN_JS};
+    const resolved = {{}};
+    for (const [name, spec] of Object.entries(specs)) {{
+        const el = spec.css
+            ? document.querySelector(spec.css)
+            : scan({{tags: spec.tags, text: spec.text, exact: !!spec.exact, reverse: !!spec.reverse}});
+        if (el) resolved[name] = uniqueSelector(el);
+    }}
+    return resolved;
+}}
+"""
+
 
-async def inspect():
+async def resolve(page, names):
+    return await page.evaluate(RESOLVE_JS, {name: target_spec(name) for name in names})
+
+
+async def inspect(headless=False, linger=30, write=True):
     async with async_playwright() as p:
-        context = await p.chromium.launch_persistent_context(
-            user_data_dir=USER_DATA_DIR,
-            headless=False, # 目視もできるように
-            args=["--start-maximized"]
-        )
-        page = await context.new_page()
+        # browser_daemon.py が起動していれば接続（起動待ちなし）、なければ起動
+        session = await open_note_context(p, USER_DATA_DIR, headless=headless) # 既定は目視もできるように
+        page = await session.context.new_page()
         await page.goto("https://note.com/notes/new")
         
         # エディタ待機
@@ -21,24 +66,15 @@ async def inspect():
             print("timeout")
             return
 
-        print(">>> 調査開始: タイトル周辺のHTMLをダンプします")
-        
-        # タイトルの親要素などを取得して表示
-        # 一般的に記事エディタのヘッダー部分にあるはず
+        print(">>> 調査開始: エディタのDOMスナップショットを取得します")
         
-        # main要素の中身を少し探る
-        buttons = await page.query_selector_all('button')
+        snapshot = await page.evaluate(SNAPSHOT_JS)
+        buttons = [e for e in snapshot if e["tag"] == "button"]
         print(f"Total buttons: {len(buttons)}")
         
         for i, btn in enumerate(buttons):
-            label = await btn.get_attribute("aria-label")
-            text = await btn.inner_text()
-            print(f"Button {i}: Label='{label}', Text='{text}'")
+            print(f"Button {i}: Label='{btn['label']}', Text='{btn['text']}', Selector='{btn['selector']}'")
 
-        # iconっぽいものを探す
-        images = await page.query_selector_all('img, svg')
-        print(f"Images/SVGs found: {len(images)}")
-        
         # o-noteEYecatch を含む要素を探す
         eyecatch = await page.query_selector('.o-noteEYecatch')
         if eyecatch:
@@ -47,13 +83,51 @@ async def inspect():
             print(html[:200])
         else:
             print("Not found .o-noteEYecatch")
-            
-        # タイトルエリアの前の要素を探る
-        title_area = await page.query_selector('textarea[placeholder*="タイトル"]')
+
+        # 1) エディタ直後に存在する要素
+        selectors = await resolve(page, STARTUP_TARGETS)
+
+        # 2) +メニューを開いて各項目を解決
+        if "editor" in selectors and "plus_menu" in selectors:
+            await page.click(selectors["editor"])
+            await page.click(selectors["plus_menu"])
+            await page.wait_for_timeout(500)
+            selectors.update(await resolve(page, [f"menu:{item}" for item in MENU_ITEMS]))
+            await page.keyboard.press("Escape")
+
+        # 3) 見出し画像メニュー（「画像をアップロード」）
+        if "banner_add" in selectors:
+            await page.click(selectors["banner_add"])
+            await page.wait_for_timeout(500)
+            selectors.update(await resolve(page, ["banner_upload"]))
+            await page.keyboard.press("Escape")
+
+        print(">>> 解決済みセレクタ:")
+        for name, css in selectors.items():
+            print(f"    {name:<24} {css}")
+
+        if write:
+            os.makedirs(os.path.dirname(SELECTOR_MAP_PATH), exist_ok=True)
+            with open(SELECTOR_MAP_PATH, "w", encoding="utf-8") as f:
+                json.dump({
+                    "generated_at": datetime.datetime.now().isoformat(),
+                    "url": page.url,
+                    "selectors": selectors,
+                }, f, ensure_ascii=False, indent=2)
+            with open(DOM_SNAPSHOT_PATH, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False, indent=2)
+            print(f">>> セレクタ対応表を保存しました: {SELECTOR_MAP_PATH}")
         
-        # 30秒待機（手動確認用）
-        await asyncio.sleep(30)
-        await context.close()
+        # 待機（手動確認用）
+        if linger and not headless:
+            await asyncio.sleep(linger)
+        await page.close()
+        await session.close()
 
 if __name__ == "__main__":
-    asyncio.run(inspect())
+    parser = argparse.ArgumentParser(description="Snapshot the note editor DOM and generate the publisher selector map")
+    parser.add_argument("--headless", action="store_true", help="Launch without a window")
+    parser.add_argument("--linger", type=int, default=30, help="Seconds to keep the page open for manual checks")
+    parser.add_argument("--no-write", action="store_true", help="Print only; do not update selector_map.json")
+    args = parser.parse_args()
+    asyncio.run(inspect(headless=args.headless, linger=args.linger, write=not args.no_write))
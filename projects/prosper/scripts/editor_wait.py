@@ -0,0 +1,208 @@
+"""
+Editor Wait Layer
+=================
+Noteエディタ操作後の「待ち」を一元管理するモジュール。
+- fast: DOM変化・アップロード応答・埋め込みカード出現などの実イベントで解決（タイムアウトは保険）
+- conservative: 従来通りの固定スリープ（V10の挙動）
+- PhaseTimer: フェーズ別の所要時間を集計し、実行後にサマリーを表示する
+"""
+
+import time
+import asyncio
+from contextlib import asynccontextmanager
+
+WAIT_MODES = ("fast", "conservative")
+
+EDITOR_SELECTOR = 'div[contenteditable="true"][role="textbox"]'
+
+# 埋め込みカードとして扱う要素（noteはfigure/iframeでカード化する）
+EMBED_SELECTOR = "figure[embedded-service], figure iframe, div[data-embed], iframe"
+
+# MutationObserverを事前に仕掛け、最後の変化から quietMs 経過した時点で解決するPromiseを window に置く。
+# 操作より前に仕掛けることで「操作直後に変化が終わっていた」取りこぼしを防ぐ。
+_ARM_MUTATION_JS = """
+({selector, quietMs, timeoutMs}) => {
+    const root = document.querySelector(selector) || document.body;
+    window.__prosperWait = new Promise(resolve => {
+        let quiet = null;
+        let seen = false;
+        const finish = (ok) => {
+            observer.disconnect();
+            clearTimeout(quiet);
+            clearTimeout(hard);
+            resolve(ok);
+        };
+        const observer = new MutationObserver(() => {
+            seen = true;
+            clearTimeout(quiet);
+            quiet = setTimeout(() => finish(true), quietMs);
+        });
+        observer.observe(root, {childList: true, subtree: true, characterData: true, attributes: true});
+        const hard = setTimeout(() => finish(seen), timeoutMs);
+    });
+}
+"""
+
+_AWAIT_MUTATION_JS = "() => window.__prosperWait || true"
+
+_COUNT_JS = "(selector) => document.querySelectorAll(selector).length"
+
+
+class PhaseTimer:
+    """フェーズ名ごとに所要時間と回数を集計する"""
+
+    def __init__(self):
+        self.totals = {}
+        self.counts = {}
+        self.started = time.perf_counter()
+
+    def record(self, phase, seconds):
+        self.totals[phase] = self.totals.get(phase, 0.0) + seconds
+        self.counts[phase] = self.counts.get(phase, 0) + 1
+
+    @asynccontextmanager
+    async def span(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, time.perf_counter() - start)
+
+    def summary(self, title="Phase Timing"):
+        wall = time.perf_counter() - self.started
+        lines = [f">>> {title} (wall {wall:.2f}s)"]
+        for phase, total in sorted(self.totals.items(), key=lambda kv: kv[1], reverse=True):
+            count = self.counts[phase]
+            lines.append(f"    {phase:<16} {total:8.2f}s  x{count:<4d} avg {total / count:6.3f}s")
+        return "\n".join(lines)
+
+
+class EditorWaiter:
+    """
+    エディタ操作の待機戦略。
+    fastモードでは実イベントで待機を打ち切り、conservativeモードでは固定スリープを使う。
+    どちらのモードでも待機時間は PhaseTimer に記録される。
+    """
+
+    def __init__(self, page, mode="fast", timer=None, quiet_ms=120, timeout_ms=3000):
+        if mode not in WAIT_MODES:
+            raise ValueError(f"Unknown wait mode: {mode} (expected one of {WAIT_MODES})")
+        self.page = page
+        self.mode = mode
+        self.timer = timer or PhaseTimer()
+        self.quiet_ms = quiet_ms
+        self.timeout_ms = timeout_ms
+
+    @property
+    def fast(self):
+        return self.mode == "fast"
+
+    async def sleep(self, phase, seconds):
+        """conservativeモード用の固定待機（fastモードでは何もしない）"""
+        if self.fast or seconds <= 0:
+            return
+        async with self.timer.span(f"wait:{phase}"):
+            await asyncio.sleep(seconds)
+
+    @asynccontextmanager
+    async def mutation(self, phase, fallback, timeout_ms=None):
+        """
+        ブロック内の操作がエディタDOMを変化させ、落ち着くまで待つ。
+        conservativeモードでは操作後に fallback 秒スリープする。
+        """
+        if not self.fast:
+            yield
+            await self.sleep(phase, fallback)
+            return
+
+        await self.page.evaluate(_ARM_MUTATION_JS, {
+            "selector": EDITOR_SELECTOR,
+            "quietMs": self.quiet_ms,
+            "timeoutMs": timeout_ms or self.timeout_ms,
+        })
+        yield
+        async with self.timer.span(f"wait:{phase}"):
+            await self.page.evaluate(_AWAIT_MUTATION_JS)
+
+    async def menu_item(self, selector, fallback=0.5):
+        """+メニュー展開待ち: 対象項目が表示されたら即座に解決"""
+        if not self.fast:
+            await self.sleep("menu", fallback)
+            return
+        async with self.timer.span("wait:menu"):
+            try:
+                await self.page.wait_for_selector(selector, state="visible", timeout=self.timeout_ms)
+            except Exception:
+                pass
+
+    async def count(self, selector):
+        return await self.page.evaluate(_COUNT_JS, selector)
+
+    async def upload(self, set_files, fallback=5.0, timeout_ms=30000):
+        """
+        画像アップロード待ち。
+        fast: アップロードPOSTの応答完了 → エディタ内のimg増加・デコード完了まで待つ。
+        """
+        if not self.fast:
+            await set_files()
+            await self.sleep("upload", fallback)
+            return
+
+        before = await self.count(f"{EDITOR_SELECTOR} img")
+        async with self.timer.span("wait:upload"):
+            try:
+                async with self.page.expect_response(
+                    lambda r: r.request.method == "POST" and r.request.resource_type in ("xhr", "fetch"),
+                    timeout=timeout_ms,
+                ):
+                    await set_files()
+            except Exception:
+                print("   >>> (wait) アップロード応答を検知できませんでした。DOMで確認します。", flush=True)
+            try:
+                await self.page.wait_for_function(
+                    """({selector, before}) => {
+                        const imgs = document.querySelectorAll(selector);
+                        return imgs.length > before && Array.from(imgs).every(img => img.complete);
+                    }""",
+                    arg={"selector": f"{EDITOR_SELECTOR} img", "before": before},
+                    timeout=timeout_ms,
+                )
+            except Exception:
+                print("   >>> (wait) 画像の表示を確認できませんでした（タイムアウト）。", flush=True)
+
+    async def embed(self, before, fallback=2.0, timeout_ms=5000):
+        """URL埋め込み待ち: 埋め込みカード要素が増えたら解決"""
+        if not self.fast:
+            await self.sleep("embed", fallback)
+            return
+        async with self.timer.span("wait:embed"):
+            try:
+                await self.page.wait_for_function(
+                    "({selector, before}) => document.querySelectorAll(selector).length > before",
+                    arg={"selector": EMBED_SELECTOR, "before": before},
+                    timeout=timeout_ms,
+                )
+            except Exception:
+                print("   >>> (wait) 埋め込みカードを確認できませんでした（タイムアウト）。", flush=True)
+
+    async def visible(self, phase, selector, fallback, timeout_ms=None):
+        """特定要素（モーダルの保存ボタン等）の出現待ち"""
+        if not self.fast:
+            await self.sleep(phase, fallback)
+            return
+        async with self.timer.span(f"wait:{phase}"):
+            try:
+                await self.page.wait_for_selector(selector, state="visible", timeout=timeout_ms or self.timeout_ms)
+            except Exception:
+                pass
+
+    async def hidden(self, phase, selector, fallback, timeout_ms=None):
+        """特定要素（モーダル等）の消滅待ち"""
+        if not self.fast:
+            await self.sleep(phase, fallback)
+            return
+        async with self.timer.span(f"wait:{phase}"):
+            try:
+                await self.page.wait_for_selector(selector, state="hidden", timeout=timeout_ms or self.timeout_ms)
+            except Exception:
+                pass
@@ -0,0 +1,131 @@
+"""
+Image Pipeline
+==============
+[IMAGE] / [BANNER] をアップロード前に最適化する。
+- noteの表示幅（デフォルト1280px）まで縮小し、JPEG / WebP に再エンコード
+- 元画像の内容ハッシュ + 変換パラメータで出力をキャッシュ（変更のない画像は再処理しない）
+- ProcessPoolExecutorで並列処理し、ブラウザ起動と重ねて実行する
+Pillowが無い環境では元画像をそのまま使う。
+"""
+
+import os
+import asyncio
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+IMAGE_FORMATS = ("jpeg", "webp", "original")
+
+_EXTENSIONS = {"jpeg": ".jpg", "webp": ".webp"}
+
+_executor = None
+
+
+def _shared_executor():
+    """全Publisherで共有するプロセスプール（キューモードで記事ごとに作らない）"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=max(1, min(4, (os.cpu_count() or 2) - 1)))
+    return _executor
+
+
+def cache_key(src, max_width, fmt, quality):
+    """元画像の内容と変換パラメータから決まるキャッシュキー"""
+    digest = hashlib.sha256()
+    with open(src, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    digest.update(f"|{max_width}|{fmt}|{quality}".encode("ascii"))
+    return digest.hexdigest()[:24]
+
+
+def process_image(src, cache_dir, max_width=1280, fmt="jpeg", quality=82):
+    """
+    1枚を変換してキャッシュ上のパスを返す（プロセスプールから呼ばれるためトップレベル関数）。
+    戻り値: (出力パス, キャッシュヒットか)
+    """
+    out_path = os.path.join(cache_dir, cache_key(src, max_width, fmt, quality) + _EXTENSIONS[fmt])
+    keep_marker = out_path + ".keep" # 元画像の方が小さかった印
+    if os.path.exists(out_path):
+        return out_path, True
+    if os.path.exists(keep_marker):
+        return src, True
+
+    with Image.open(src) as img:
+        img = ImageOps.exif_transpose(img)
+        resized = img.width > max_width
+        if resized:
+            height = round(img.height * max_width / img.width)
+            img = img.resize((max_width, height), Image.LANCZOS)
+
+        if fmt == "jpeg":
+            if img.mode in ("RGBA", "LA", "P"):
+                # JPEGは透過を持てないため白背景に合成
+                rgba = img.convert("RGBA")
+                background = Image.new("RGB", rgba.size, (255, 255, 255))
+                background.paste(rgba, mask=rgba.getchannel("A"))
+                img = background
+            elif img.mode != "RGB":
+                img = img.convert("RGB")
+            save_kwargs = {"quality": quality, "optimize": True, "progressive": True}
+        else:
+            save_kwargs = {"quality": quality, "method": 4}
+
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = out_path + f".{os.getpid()}.tmp"
+        img.save(tmp_path, format=fmt.upper(), **save_kwargs)
+        os.replace(tmp_path, out_path)
+
+    # 縮小不要で、再エンコードで逆に大きくなった場合は元画像を使う
+    if not resized and os.path.getsize(out_path) >= os.path.getsize(src):
+        os.remove(out_path)
+        open(keep_marker, "w").close()
+        return src, False
+    return out_path, False
+
+
+class ImagePipeline:
+    def __init__(self, cache_dir, max_width=1280, fmt="jpeg", quality=82):
+        self.cache_dir = cache_dir
+        self.max_width = max_width
+        self.fmt = fmt
+        self.quality = quality
+        self.futures = {} # 元パス -> concurrent.futures.Future
+
+        self.enabled = fmt != "original"
+        if self.enabled and Image is None:
+            print(">>> [Image] Pillowが見つからないため、画像は最適化せずにアップロードします。", flush=True)
+            self.enabled = False
+
+    def start(self, paths):
+        """変換ジョブを投入する（イベントループ不要。parse_markdown直後に呼ぶ）"""
+        if not self.enabled:
+            return
+        for path in dict.fromkeys(paths):
+            if path in self.futures or not os.path.exists(path):
+                continue
+            self.futures[path] = _shared_executor().submit(
+                process_image, path, self.cache_dir, self.max_width, self.fmt, self.quality
+            )
+        if self.futures:
+            print(f">>> [Image] {len(self.futures)}枚の画像を最適化中 ({self.fmt}, {self.max_width}px, q={self.quality})", flush=True)
+
+    async def resolve(self, path):
+        """最適化済みのパスを返す（未完了なら待つ。失敗時は元画像）"""
+        future = self.futures.get(path)
+        if future is None:
+            return path
+        try:
+            out_path, hit = await asyncio.wrap_future(future)
+        except Exception as e:
+            print(f">>> [Image] 最適化に失敗したため元画像を使います: {os.path.basename(path)}: {e}", flush=True)
+            return path
+        if out_path != path:
+            before = os.path.getsize(path) // 1024
+            after = os.path.getsize(out_path) // 1024
+            print(f"   >>> [Image] {os.path.basename(path)}: {before}KB -> {after}KB{' (cache)' if hit else ''}", flush=True)
+        return out_path
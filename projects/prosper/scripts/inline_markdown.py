@@ -0,0 +1,69 @@
+"""
+Inline Markdown
+===============
+段落内のインライン記法を、エディタへ1回でペーストできるHTML断片に変換する。
+- **太字** / __太字__ -> <strong>
+- *斜体* / _斜体_     -> <em>
+- [テキスト](URL)     -> <a href>
+- `コード`            -> <code>（中の記法は解釈しない）
+strip_inline はプレーンテキスト（text/plain やDOM照合用）を返す。
+"""
+
+import re
+import html
+
+_CODE_SPLIT_RE = re.compile(r'`([^`\n]+)`')
+# URLは括弧を1段までなら含められる (例: https://en.wikipedia.org/wiki/Fight_Club_(novel))
+_LINK_RE = re.compile(r'\[([^\]\n]+)\]\(((?:[^()\s]|\([^()\s]*\))+)\)')
+# リンクを一時的に置き換える目印（href内の _ や * を強調として解釈しないため）
+_PLACEHOLDER_RE = re.compile(r'\x00(\d+)\x00')
+_BOLD_RE = re.compile(r'\*\*(?=\S)(.+?)(?<=\S)\*\*|__(?=\S)(.+?)(?<=\S)__')
+# 英単語中の _ や URL中の _ を斜体にしないよう、前後が単語文字でないことを要求する
+_ITALIC_RE = re.compile(r'(?<![*\w])\*(?=\S)(.+?)(?<=\S)\*(?!\*)|(?<![_\w])_(?=\S)(.+?)(?<=\S)_(?![_\w])')
+
+
+def _render_emphasis(text):
+    out = html.escape(text)
+    out = _BOLD_RE.sub(lambda m: f"<strong>{m.group(1) or m.group(2)}</strong>", out)
+    out = _ITALIC_RE.sub(lambda m: f"<em>{m.group(1) or m.group(2)}</em>", out)
+    return out
+
+
+def _render_text(text):
+    # リンクを先に目印へ置き換え、強調の変換後に戻す（URLは強調の対象にしない）
+    links = []
+
+    def stash(m):
+        links.append(f'<a href="{html.escape(m.group(2), quote=True)}">{_render_emphasis(m.group(1))}</a>')
+        return f"\x00{len(links) - 1}\x00"
+
+    out = _render_emphasis(_LINK_RE.sub(stash, text))
+    return _PLACEHOLDER_RE.sub(lambda m: links[int(m.group(1))], out)
+
+
+def render_inline(text):
+    """1行分のインライン記法をHTML断片に変換する（ブロック要素は付けない）"""
+    parts = _CODE_SPLIT_RE.split(text)
+    # split結果は [テキスト, コード, テキスト, コード, ...] の交互
+    return "".join(
+        _render_text(part) if i % 2 == 0 else f"<code>{html.escape(part)}</code>"
+        for i, part in enumerate(parts)
+    )
+
+
+def strip_inline(text):
+    """記法を取り除いたプレーンテキスト"""
+    parts = _CODE_SPLIT_RE.split(text)
+    plain = []
+    for i, part in enumerate(parts):
+        if i % 2 == 0:
+            part = _LINK_RE.sub(r'\1', part)
+            part = _BOLD_RE.sub(lambda m: m.group(1) or m.group(2), part)
+            part = _ITALIC_RE.sub(lambda m: m.group(1) or m.group(2), part)
+        plain.append(part)
+    return "".join(plain)
+
+
+def has_inline(text):
+    """インライン記法を含むか（含まなければinsert_textで足りる）"""
+    return strip_inline(text) != text
@@ -0,0 +1,150 @@
+"""
+Note Block AST
+==============
+parse_markdown が出力する行リストを、エディタへ一括投入できるブロック単位に変換する。
+- paragraph: 連続する通常行（空行は空段落として保持）
+- heading: H2/H3
+- list: 連続する箇条書き / 番号付きリスト
+- quote: 連続する引用行
+- image / embed / toc / paywall / divider: 単独ブロック
+インライン記法（太字・斜体・リンク・コード）は inline_markdown で段落やリスト項目のHTMLに変換する。
+"""
+
+import os
+import re
+import hashlib
+from dataclasses import dataclass, field
+
+from inline_markdown import render_inline, strip_inline
+
+BLOCK_KINDS = ("paragraph", "heading", "list", "quote", "image", "embed", "toc", "paywall", "divider")
+
+# 本文テキストでDOM上の存在を確認できるブロック
+TEXT_KINDS = ("paragraph", "heading", "list", "quote")
+
+_ORDERED_RE = re.compile(r'^\d+\.\s')
+
+
+@dataclass
+class Block:
+    kind: str
+    lines: list = field(default_factory=list) # paragraph/list/quote の本文行、heading は1要素
+    level: int = 0                            # heading: 2 or 3
+    ordered: bool = False                     # list: 番号付きか
+    closed: bool = False                      # list: 直後の空行で閉じられたか
+    path: str = ""                            # image: 絶対パス
+    url: str = ""                             # embed: URL
+
+    @property
+    def text(self):
+        return "\n".join(self.lines)
+
+    def to_html(self):
+        """一括ペースト用のHTML断片（paragraph / list のみ）"""
+        if self.kind == "paragraph":
+            return "".join(f"<p>{render_inline(line.strip())}</p>" if line.strip() else "<p><br></p>"
+                           for line in self.lines)
+        if self.kind == "list":
+            tag = "ol" if self.ordered else "ul"
+            items = "".join(f"<li><p>{render_inline(item)}</p></li>" for item in self.lines)
+            return f"<{tag}>{items}</{tag}>"
+        raise ValueError(f"Block kind '{self.kind}' has no bulk HTML form")
+
+    def fingerprint(self):
+        """ブロック内容のハッシュ（記事が編集されたかどうかの判定に使う）"""
+        raw = "\x1f".join([self.kind, str(self.level), str(self.ordered), self.path, self.url, *self.lines])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+    def signature_lines(self):
+        """エディタのinnerTextに現れるはずの行（空行を除く、インライン記法は除去）"""
+        if self.kind not in TEXT_KINDS:
+            return []
+        return [strip_inline(line.strip()) for line in self.lines if line.strip()]
+
+    def describe(self):
+        """ログ表示用の短い説明"""
+        if self.kind == "image":
+            return os.path.basename(self.path) if self.path else ""
+        if self.kind == "embed":
+            return self.url
+        head = next((line.strip() for line in self.lines if line.strip()), "")
+        head = head[:30] + "..." if len(head) > 30 else head
+        return f"{head} ({len(self.lines)} lines)" if len(self.lines) > 1 else head
+
+
+def parse_blocks(lines):
+    """行リストをブロックのリストに変換する"""
+    blocks = []
+
+    def last(kind):
+        return blocks[-1] if blocks and blocks[-1].kind == kind else None
+
+    for line in lines:
+        stripped = line.strip()
+
+        # 空行: 直前のリストを閉じる（空行1つ分を消費）か、空段落として保持
+        if stripped == "":
+            lst = last("list")
+            if lst and not lst.closed:
+                lst.closed = True
+                continue
+            para = last("paragraph")
+            if para:
+                para.lines.append("")
+            else:
+                blocks.append(Block("paragraph", [""]))
+            continue
+
+        if stripped.startswith("[IMAGE]:"):
+            blocks.append(Block("image", path=stripped.replace("[IMAGE]:", "").strip()))
+            continue
+
+        if stripped == "[TOC]":
+            blocks.append(Block("toc"))
+            continue
+
+        if "<!-- PAYWALL -->" in stripped:
+            blocks.append(Block("paywall"))
+            continue
+
+        if stripped in ('---', '***', '___'):
+            blocks.append(Block("divider"))
+            continue
+
+        if stripped.startswith('## '):
+            blocks.append(Block("heading", [stripped[3:]], level=2))
+            continue
+
+        if stripped.startswith('### '):
+            blocks.append(Block("heading", [stripped[4:]], level=3))
+            continue
+
+        if stripped.startswith('> '):
+            quote = last("quote")
+            if quote:
+                quote.lines.append(stripped[2:])
+            else:
+                blocks.append(Block("quote", [stripped[2:]]))
+            continue
+
+        if stripped.startswith(('- ', '* ')) or _ORDERED_RE.match(stripped):
+            ordered = bool(_ORDERED_RE.match(stripped))
+            content = _ORDERED_RE.sub('', stripped) if ordered else stripped[2:]
+            lst = last("list")
+            if lst and not lst.closed and lst.ordered == ordered:
+                lst.lines.append(content)
+            else:
+                blocks.append(Block("list", [content], ordered=ordered))
+            continue
+
+        if stripped.startswith("http"):
+            blocks.append(Block("embed", url=stripped))
+            continue
+
+        para = last("paragraph")
+        if para:
+            para.lines.append(line)
+        else:
+            blocks.append(Block("paragraph", [line]))
+
+    return blocks
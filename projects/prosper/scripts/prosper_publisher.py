@@ -7,26 +7,115 @@ Note自動投稿スクリプトの完成形。
 - 画像: [IMAGE]: path で本文挿入
 - バナー: [BANNER]: path で見出し画像設定
 - 拡張: [TOC], <!-- PAYWALL -->, URL埋め込み対応
+- 一括投入: 段落・リストはブロック単位でHTMLペースト（--insert-mode line で従来の行単位入力）
+- インライン記法: **太字** / *斜体* / [リンク](URL) / `コード` をHTML断片にしてペースト（Cmd+B操作は廃止）
+- キュー: --queue で複数記事を並行投稿（[ACCOUNT]: name でアカウント別コンテキスト）
+- 再開: ブロックごとにチェックポイントを保存し、中断した下書きの続きから投入（--fresh で無効化）
+- 画像: アップロード前に縮小・再エンコード（内容ハッシュでキャッシュ、ブラウザ起動と並行処理）
+- 常駐ブラウザ: browser_daemon.py が起動していればCDPで接続（--headless / --no-attach）
+- セレクタ: debug_selector.py が生成した対応表を優先し、外れたときだけページ内で1回走査
 """
 
 import os
 import re
+import json
 import asyncio
+import hashlib
+import argparse
+import datetime
 from playwright.async_api import async_playwright
 
+from editor_wait import EditorWaiter, PhaseTimer, WAIT_MODES, EMBED_SELECTOR, EDITOR_SELECTOR
+from note_blocks import parse_blocks
+from inline_markdown import render_inline, strip_inline, has_inline
+from browser_session import open_note_context, DEFAULT_ACCOUNT
+from publish_queue import PublishQueue, collect_articles
+from image_pipeline import ImagePipeline, IMAGE_FORMATS
+from selector_map import SelectorMap
+
+INSERT_MODES = ("html", "line")
+
+# ProseMirrorはpasteイベントのclipboardDataを自前で解釈するため、合成イベントでHTMLを一括投入できる。
+# ハンドラがpreventDefaultした（=エディタが取り込んだ）場合にtrueを返す。
+_PASTE_HTML_JS = """
+({html, text}) => {
+    const target = document.activeElement && document.activeElement.isContentEditable
+        ? document.activeElement
+        : document.querySelector('div[contenteditable="true"][role="textbox"]');
+    const data = new DataTransfer();
+    data.setData('text/html', html);
+    data.setData('text/plain', text);
+    const event = new ClipboardEvent('paste', {clipboardData: data, bubbles: true, cancelable: true});
+    return !target.dispatchEvent(event);
+}
+"""
+
+# 再開時のDOM確認用: エディタ本文のテキストと画像・埋め込み数を1回で取得する
+_EDITOR_SNAPSHOT_JS = """
+({editor, embed}) => {
+    const root = document.querySelector(editor);
+    if (!root) return null;
+    return {
+        text: root.innerText,
+        images: root.querySelectorAll('img').length,
+        embeds: root.querySelectorAll(embed).length,
+    };
+}
+"""
+
+# キャレットを本文末尾へ移動し、末尾が空段落かどうかを返す
+_CARET_TO_END_JS = """
+(selector) => {
+    const root = document.querySelector(selector);
+    root.focus();
+    const range = document.createRange();
+    range.selectNodeContents(root);
+    range.collapse(false);
+    const selection = window.getSelection();
+    selection.removeAllRanges();
+    selection.addRange(range);
+    const last = root.lastElementChild;
+    return !!last && last.tagName === 'P' && last.textContent.trim() === '' && !last.querySelector('img');
+}
+"""
+
 # ---------------------------------------------------------
 # 設定
 # ---------------------------------------------------------
 ARTICLE_PATH = "/Users/yukinari/Desktop/antigravity/projects/prosper/article_001_fight_club_marketing.md"
 USER_DATA_DIR = "/Users/yukinari/Desktop/antigravity/projects/prosper/.note_user_data"
+QUEUE_LOG_PATH = "/Users/yukinari/Desktop/antigravity/projects/prosper/state/publish_results.jsonl"
+PUBLISH_STATE_DIR = "/Users/yukinari/Desktop/antigravity/projects/prosper/state/publish"
+IMAGE_CACHE_DIR = "/Users/yukinari/Desktop/antigravity/projects/prosper/state/image_cache"
+SELECTOR_MAP_PATH = "/Users/yukinari/Desktop/antigravity/projects/prosper/state/selector_map.json"
+NOTE_NEW_URL = "https://note.com/notes/new"
+
+
+class EditorNotReady(Exception):
+    """エディタが規定時間内に表示されなかった"""
 
 class ProsperPublisherV10:
-    def __init__(self, article_path):
+    def __init__(self, article_path, wait_mode="fast", insert_mode="html", account=None, resume=True,
+                 images=None, headless=False, attach=True, state_dir=PUBLISH_STATE_DIR, selectors=None):
         self.article_path = article_path
+        self.state_dir = state_dir
+        self.headless = headless # 目視不要ならヘッドレスで起動
+        self.attach = attach     # browser_daemon.py が起動していれば接続する
+        self.images = images or ImagePipeline(IMAGE_CACHE_DIR)
+        self.selectors = selectors or SelectorMap(SELECTOR_MAP_PATH) # debug_selector.py で生成した対応表
+        self.resume = resume # Falseなら保存済みチェックポイントを無視して新規下書き
+        self.state = None
         self.title = ""
         self.banner_path = None # バナー画像パス
+        self.account = account or DEFAULT_ACCOUNT # 投稿アカウント（[ACCOUNT]: name で上書き）
+        self.account_override = account is not None
         self.lines = []
+        self.blocks = []
+        self.insert_mode = insert_mode
         self.page = None
+        self.wait_mode = wait_mode
+        self.timer = PhaseTimer()
+        self.waiter = None
 
     def parse_markdown(self):
         """Markdownを読み込み、内部形式に変換する"""
@@ -49,6 +138,12 @@ class ProsperPublisherV10:
                 self.banner_path = os.path.abspath(os.path.join(base_dir, rel_path))
                 continue
 
+            # 投稿アカウント: [ACCOUNT]: name（CLI指定があればそちらを優先）
+            if line.startswith("[ACCOUNT]:"):
+                if not self.account_override:
+                    self.account = line.replace("[ACCOUNT]:", "").strip() or DEFAULT_ACCOUNT
+                continue
+
             # タイトル（H1）は別扱い（最初の#のみ）
             if line.startswith('# ') and not line.startswith('## '):
                 self.title = line[2:].strip()
@@ -65,7 +160,14 @@ class ProsperPublisherV10:
             
             self.lines.append(line)
 
-        print(f"パース完了: タイトル='{self.title}', バナー={'あり' if self.banner_path else 'なし'}", flush=True)
+        self.blocks = parse_blocks(self.lines)
+
+        # 画像の最適化はここで投入し、ブラウザ起動・エディタ準備と並行して進める
+        image_paths = [block.path for block in self.blocks if block.kind == "image"]
+        self.images.start(([self.banner_path] if self.banner_path else []) + image_paths)
+
+        print(f"パース完了: タイトル='{self.title}', バナー={'あり' if self.banner_path else 'なし'}, "
+              f"{len(self.lines)}行 -> {len(self.blocks)}ブロック", flush=True)
         return True
 
     async def paste_text(self, text: str):
@@ -74,353 +176,498 @@ class ProsperPublisherV10:
         クリップボードもIMEも経由せず、ブラウザにテキストイベントを送信する。
         """
         await self.page.keyboard.insert_text(text)
-        await asyncio.sleep(0.1)
+        await self.waiter.sleep("text", 0.1)
 
-    async def click_plus_menu(self, menu_item_text: str):
-        """+メニューを開いて指定の項目をクリックするヘルパー"""
-        plus_button = await self.page.query_selector('button[aria-label="メニューを開く"]')
+    async def click_plus_menu(self, menu_item_text: str, settle=True):
+        """
+        +メニューを開いて指定の項目をクリックするヘルパー。
+        settle=False はファイル選択など、エディタDOMが即座に変化しない項目用。
+        """
+        plus_button = await self.selectors.find(self.page, "plus_menu")
         if plus_button:
             await plus_button.click()
-            await asyncio.sleep(0.5) # メニュー展開待ち
-            
-            menu_btn = await self.page.query_selector(f'button:has-text("{menu_item_text}")')
+            name = f"menu:{menu_item_text}"
+            item_selector = self.selectors.selectors.get(name, f'button:has-text("{menu_item_text}")')
+            await self.waiter.menu_item(item_selector) # メニュー展開待ち
+
+            menu_btn = await self.selectors.find(self.page, name)
             if menu_btn:
-                await menu_btn.click()
-                await asyncio.sleep(1.0) # 実行待ち
+                if settle:
+                    async with self.waiter.mutation("menu", 1.0): # 実行待ち
+                        await menu_btn.click()
+                else:
+                    await menu_btn.click()
                 return True
         return False
 
+    async def press_enter(self, phase="enter", fallback=0.0):
+        """Enterで新しいブロックを作り、エディタの反映を待つ"""
+        async with self.waiter.mutation(phase, fallback):
+            await self.page.keyboard.press("Enter")
+
+    async def paste_html(self, html: str, text: str):
+        """
+        HTML断片を1回のpasteイベントで投入する。
+        エディタが取り込まなかった場合はFalseを返す（呼び出し側で行単位入力にフォールバック）。
+        """
+        handled = False
+        async with self.waiter.mutation("paste", 0.5):
+            handled = await self.page.evaluate(_PASTE_HTML_JS, {"html": html, "text": text})
+        return handled
+
+    async def insert_inline(self, line: str):
+        """
+        1行分のテキストを入力する。
+        インライン記法があればHTML断片として1回でペーストし、取り込まれなければ記法を除いたテキストを入力する。
+        """
+        if has_inline(line) and await self.paste_html(render_inline(line), strip_inline(line)):
+            return
+        await self.paste_text(strip_inline(line))
+
+    # ---------------------------------------------------------
+    # ブロック投入
+    # ---------------------------------------------------------
+    async def insert_block(self, block):
+        handler = getattr(self, f"insert_{block.kind}")
+        await handler(block)
+
+    async def insert_paragraph(self, block):
+        # 空行だけの段落はEnterのみで足りる
+        bulk = any(line.strip() for line in block.lines)
+        if bulk and self.insert_mode == "html":
+            if await self.paste_html(block.to_html(), block.text):
+                await self.press_enter()
+                return
+            print("   >>> HTMLペーストが取り込まれませんでした。行単位入力に切り替えます。", flush=True)
+            self.insert_mode = "line"
+
+        for line in block.lines:
+            if line.strip():
+                await self.insert_inline(line)
+            await self.press_enter("text", 0.5)
+
+    async def insert_list(self, block):
+        if self.insert_mode == "html":
+            if await self.paste_html(block.to_html(), block.text):
+                # 末尾の項目から抜ける: 空項目を作ってもう一度Enter
+                await self.press_enter()
+                await self.press_enter("list", 0.2)
+                return
+            print("   >>> HTMLペーストが取り込まれませんでした。行単位入力に切り替えます。", flush=True)
+            self.insert_mode = "line"
+
+        await self.click_plus_menu("番号付きリスト" if block.ordered else "箇条書きリスト")
+        for item in block.lines:
+            await self.insert_inline(item)
+            await self.press_enter("list", 0.5)
+        # 空項目でEnter → リスト終了
+        await self.press_enter("list", 0.2)
+
+    async def insert_heading(self, block):
+        # insert_textでは自動変換が効かないため、メニューから指定
+        # 見出しは書式を持てないため記法を除いて入力
+        await self.click_plus_menu("大見出し" if block.level == 2 else "小見出し")
+        await self.paste_text(strip_inline(block.lines[0]))
+        await self.press_enter("heading", 0.5)
+
+    async def insert_quote(self, block):
+        # 複数行の引用は1つの引用ブロック内で Shift+Enter 改行
+        await self.click_plus_menu("引用")
+        for j, line in enumerate(block.lines):
+            if j > 0:
+                await self.page.keyboard.press("Shift+Enter")
+            await self.insert_inline(line)
+        await self.press_enter("quote", 0.5)
+
+    async def insert_image(self, block):
+        image_path = block.path
+        print(f"   >>> 画像アップロード開始: {image_path}", flush=True)
+
+        if not os.path.exists(image_path):
+            print(f"   >>> エラー: 画像ファイルが見つかりません: {image_path}", flush=True)
+            return
+
+        # 最適化済みの画像（ブラウザ起動中に変換済みのはず）
+        upload_path = await self.images.resolve(image_path)
+
+        # ファイル選択ダイアログを待ち受ける
+        async with self.page.expect_file_chooser() as fc_info:
+            # +メニュー -> 画像 をクリック
+            # conservativeでは従来通りクリック後の1.0秒待機を残す
+            await self.click_plus_menu("画像", settle=self.wait_mode == "conservative")
+
+        file_chooser = await fc_info.value
+        # アップロードと表示待ち (conservativeでは少し長めに固定待機)
+        await self.waiter.upload(lambda: file_chooser.set_files(upload_path), fallback=5.0)
+
+        # 画像後はカーソルが画像の右または下にあるはず。Enterで次へ
+        await self.press_enter()
+
+    async def insert_embed(self, block):
+        embeds_before = await self.waiter.count(EMBED_SELECTOR)
+        await self.paste_text(block.url)
+        await self.press_enter()
+        await self.waiter.embed(embeds_before, fallback=2.0) # カード化待機
+
+    async def insert_toc(self, block):
+        await self.click_plus_menu("目次")
+        await self.press_enter("toc", 0.5)
+
+    async def insert_paywall(self, block):
+        await self.click_plus_menu("有料エリア指定")
+        await self.waiter.sleep("paywall", 1.0)
+
+    async def insert_divider(self, block):
+        await self.click_plus_menu("区切り線")
+        await self.waiter.sleep("divider", 0.5)
+        await self.press_enter()
+
     async def publish(self):
+        """単発モード: 永続コンテキストを起動して1記事を投稿する"""
         async with async_playwright() as p:
-            print(">>> Prosper Publisher V10 起動 (Final Edition)", flush=True)
+            print(f">>> Prosper Publisher V10 起動 (Final Edition / wait={self.wait_mode})", flush=True)
             
-            context = await p.chromium.launch_persistent_context(
-                user_data_dir=USER_DATA_DIR,
-                headless=False,
-                args=["--start-maximized"]
-            )
-            self.page = await context.new_page()
-            await self.page.goto("https://note.com/notes/new")
-
-            # エディタ準備待機
-            print(">>> エディタの準備を待機中...", flush=True)
+            session = await open_note_context(p, USER_DATA_DIR, self.account,
+                                              headless=self.headless, attach=self.attach)
+            page = await session.context.new_page()
             try:
-                await self.page.wait_for_selector(
-                    'textarea[placeholder*="タイトル"], div[contenteditable="true"]',
-                    timeout=300000
-                )
-            except:
-                print(">>> タイムアウト: エディタが見つかりませんでした", flush=True)
+                await self.publish_to_page(page)
+            except EditorNotReady as e:
+                print(f">>> タイムアウト: {e}", flush=True)
+                await session.close()
+                return
+            
+            print(">>> 完了！下書きを確認してください。", flush=True)
+            if session.attached:
+                # 常駐ブラウザは残すので、このタブだけ閉じて即終了
+                await page.close()
+                await session.close()
+                print(">>> 正常終了しました（常駐ブラウザは起動したままです）。", flush=True)
                 return
 
-            await asyncio.sleep(2)
-
-            # バナー画像設定 (タイトル入力の前に行う)
-            if self.banner_path:
-                print(f">>> バナー画像設定: {self.banner_path}", flush=True)
-                
-                # ユーザー情報により 'aria-label="画像を追加"' が正解と判明。
-                # ただし複数ある可能性があるため、query_selector_allで取得し、
-                # 最初の方（ヘッダー付近）にあるものを対象にする。
-                buttons = await self.page.query_selector_all('button[aria-label="画像を追加"]')
-                target_btn = None
-                
-                if buttons:
-                    # 一番上のボタンを採用
-                    target_btn = buttons[0]
-                    print("   >>> '画像を追加' ボタンを発見しました。", flush=True)
-                
-                if target_btn:
-                    await target_btn.click()
-                    await asyncio.sleep(1.0)
-                    
-                    # メニューが開いたと仮定
-                    async with self.page.expect_file_chooser() as fc_info:
-                        # "画像をアップロード" というテキストを持つ要素を探す
-                        # 親がbuttonである可能性が高いので、buttonを優先的に探す
-                        upload_btn = await self.page.query_selector('button:has-text("画像をアップロード")')
-                        
-                        if not upload_btn:
-                            # なければdivで探す
-                             upload_btn = await self.page.query_selector('div:has-text("画像をアップロード")')
-                        
-                        if upload_btn:
-                            print("   >>> '画像をアップロード' メニューをクリックします。", flush=True)
-                            await upload_btn.click()
-                            
-                            file_chooser = await fc_info.value
-                            await file_chooser.set_files(self.banner_path)
-                            print("   >>> 画像ファイルを選択しました。保存ボタンの表示を待ちます...", flush=True)
-                            await asyncio.sleep(2.0) # モーダル表示待ち
-                            
-                            # トリミング/確認画面の「保存」ボタンを押す
-                            # セレクタが効かないため、全ボタンを走査してテキストマッチで探す物理的アプローチ
-                            # 注意: ヘッダーの「下書き保存」を誤クリックしないよう、逆順（DOMの後ろから）かつ完全一致で探す
-                            
-                            await asyncio.sleep(2.0)
-                            print("   >>> 保存ボタン全検索（逆順）開始...", flush=True)
-
-                            buttons = await self.page.query_selector_all('button')
-                            clicked = False
-                            
-                            # 逆順にループ
-                            for btn in reversed(buttons):
-                                # inner_textを取得して判定
-                                text = await btn.inner_text()
-                                # 空白削除して完全一致確認
-                                if text.strip() == "保存":
-                                    print(f"   >>> '保存' ボタンを発見 (Text: {text})。クリックします。", flush=True)
-                                    await btn.click(force=True)
-                                    clicked = True
-                                    break
-                            
-                            if not clicked:
-                                print("   >>> エラー: '保存' ボタンが見つかりませんでした。", flush=True)
-
-                            await asyncio.sleep(5.0) # 適用待ち
-
-                        else:
-                            print("   >>> エラー: 「画像をアップロード」メニューが見つかりません。", flush=True)
-                else:
-                    print("   >>> エラー: '画像を追加' ボタンが見つかりません。", flush=True)
+            if not self.headless:
+                print(">>> 30秒後にブラウザを閉じます...", flush=True)
+                try:
+                    await asyncio.sleep(30)
+                except asyncio.CancelledError:
+                    pass
+            
+            print(">>> ブラウザを閉じています...", flush=True)
+            await session.close()
+            print(">>> 正常終了しました。", flush=True)
 
-            # タイトル入力
-            if self.title:
-                print(f">>> タイトル設定: {self.title[:30]}...", flush=True)
-                title_area = await self.page.query_selector('textarea[placeholder*="タイトル"]')
+    async def publish_to_page(self, page):
+        """
+        与えられたページで記事を1本投稿し、下書きのURLを返す。
+        ブラウザ/コンテキストの管理は呼び出し側（単発モード or PublishQueue）が行う。
+        """
+        self.page = page
+        self.timer = PhaseTimer()
+        self.waiter = EditorWaiter(self.page, mode=self.wait_mode, timer=self.timer)
+
+        # チェックポイント確認（前回の途中から再開できるか）
+        state = self._load_state() if self.resume else None
+        if state and state.get("status") == "done":
+            print(f">>> [Resume] 前回の投稿は完了済みです（--fresh で新規投稿）: {state.get('draft_url')}", flush=True)
+            return state.get("draft_url")
+
+        committed = -1
+        start = 0
+        resumed = False
+        if state and state.get("draft_url"):
+            saved = state.get("committed", -1)
+            committed = self._committed_prefix(state)
+            print(f">>> [Resume] {state['last_updated']} の下書きを再開: {state['draft_url']} "
+                  f"(確定済み {committed + 1}/{len(self.blocks)} ブロック)", flush=True)
+            await self._open_editor(state["draft_url"])
+            resumed = True
+            # 下書きの末尾に追記すると記事が二重・順序違いになる場合は、新しい下書きで最初から投稿し直す
+            restart = None
+            if (committed < 0 or committed < saved) and await self._draft_has_body():
+                # 確定済みのブロックが編集され、下書きにはその位置以降の古いブロックが残っている
+                restart = "確定済みのブロックより後ろに古い本文が残っているため"
+            elif committed >= 0:
+                # DOMを確認して、実際に反映されている最後のブロックの次から再開
+                start = await self._verify_resume(committed)
+                if start < committed:
+                    # 途中のブロックが欠けている (末尾に足すと後ろのブロックより後に入ってしまう)
+                    restart = f"確定済みのブロック {start + 1} が下書きの途中で欠けているため"
+            if restart:
+                print(f">>> [Resume] {restart}、新しい下書きで投稿し直します。", flush=True)
+                state = None
+                resumed = False
+                committed = -1
+                start = 0
+                await self._open_editor(NOTE_NEW_URL)
+            elif committed >= 0:
+                print(f">>> [Resume] ブロック {start + 1} から再開します。", flush=True)
+        else:
+            state = None
+            await self._open_editor(NOTE_NEW_URL)
+        self.state = state or self._new_state()
+
+        # セレクタ対応表（debug_selector.pyで生成）の有効性を1回で確認
+        await self.selectors.validate(self.page)
+
+        # バナー画像設定 (タイトル入力の前に行う / 再開時は設定済みなら飛ばす)
+        if self.banner_path and not self.state.get("banner_done"):
+            async with self.timer.span("banner"):
+                await self.set_banner()
+            self._save_state(banner_done=True, draft_url=self._draft_url())
+
+        # タイトル入力
+        if self.title:
+            print(f">>> タイトル設定: {self.title[:30]}...", flush=True)
+            async with self.timer.span("title"):
+                title_area = await self.selectors.find(self.page, "title")
                 if title_area:
                     await title_area.fill(self.title)
                     await self.page.keyboard.press("Tab")
-                    await asyncio.sleep(1)
-
-            # 本文エリアにフォーカス
-            editor_selector = 'div[contenteditable="true"][role="textbox"]'
-            await self.page.click(editor_selector)
-            await asyncio.sleep(0.5)
-
-            # 行を順番に入力
-            total = len(self.lines)
-            in_list_mode = False # リストモード管理
-
-            for i, line in enumerate(self.lines):
-                progress = int((i + 1) / total * 100)
-                # ログ表示用
-                log_line = line[:30] + "..." if len(line) > 30 else line
-                print(f"[{progress:3d}%] 行 {i+1}/{total}: {log_line} (ListMode: {in_list_mode})", flush=True)
-
-                stripped_line = line.strip()
-
-                # --- 1. 空行処理 ---
-                if stripped_line == "":
-                    if in_list_mode:
-                        # リストモード中に空行 → リスト終了（Enter x 2）
-                        await self.page.keyboard.press("Enter")
-                        in_list_mode = False
-                    else:
-                        await self.page.keyboard.press("Enter")
-                    await asyncio.sleep(0.3)
-                    continue
-
-                # --- 2. 機能ブロック検出 & 適用 ---
-
-                # [IMAGE] 画像アップロード
-                if stripped_line.startswith("[IMAGE]:"):
-                    if in_list_mode:
-                        await self.page.keyboard.press("Enter")
-                        in_list_mode = False
-                    
-                    image_path = stripped_line.replace("[IMAGE]:", "").strip()
-                    print(f"   >>> 画像アップロード開始: {image_path}", flush=True)
-                    
-                    if not os.path.exists(image_path):
-                        print(f"   >>> エラー: 画像ファイルが見つかりません: {image_path}", flush=True)
-                        continue
-
-                    # ファイル選択ダイアログを待ち受ける
-                    async with self.page.expect_file_chooser() as fc_info:
-                        # +メニュー -> 画像 をクリック
-                        await self.click_plus_menu("画像")
-                    
-                    file_chooser = await fc_info.value
-                    await file_chooser.set_files(image_path)
-                    
-                    # アップロードと表示待ち (少し長めに)
-                    await asyncio.sleep(5.0)
-                    
-                    # 画像後はカーソルが画像の右または下にあるはず。Enterで次へ
-                    await self.page.keyboard.press("Enter")
-                    continue
-
-                # [TOC] 目次
-                if stripped_line == "[TOC]":
-                    if in_list_mode:
-                        await self.page.keyboard.press("Enter")
-                        in_list_mode = False
-                    
-                    await self.click_plus_menu("目次")
-                    await self.page.keyboard.press("Enter")
-                    await asyncio.sleep(0.5)
-                    continue
-
-                # <!-- PAYWALL --> 有料エリア
-                if "<!-- PAYWALL -->" in stripped_line:
-                    if in_list_mode:
-                        await self.page.keyboard.press("Enter")
-                        in_list_mode = False
-                    
-                    await self.click_plus_menu("有料エリア指定")
-                    await asyncio.sleep(1.0)
-                    continue
-
-                # --- 区切り線 (---) ---
-                if stripped_line in ['---', '***', '___']:
-                    if in_list_mode:
-                        await self.page.keyboard.press("Enter")
-                        in_list_mode = False
-                    
-                    # 区切り線メニューをクリック
-                    await self.click_plus_menu("区切り線")
-                    await asyncio.sleep(0.5)
-                    await self.page.keyboard.press("Enter")
-                    continue
-
-                # --- 見出し (H2: ##, H3: ###) ---
-                # insert_textでは自動変換が効かないため、メニューから指定
-                if stripped_line.startswith('## '):
-                    if in_list_mode:
-                        await self.page.keyboard.press("Enter")
-                        in_list_mode = False
-                    
-                    content = stripped_line[3:] # "## " 除去
-                    await self.click_plus_menu("大見出し")
-                    await self.paste_text(content)
-                    await self.page.keyboard.press("Enter")
-                    await asyncio.sleep(0.5)
-                    continue
-                
-                if stripped_line.startswith('### '):
-                    if in_list_mode:
-                        await self.page.keyboard.press("Enter")
-                        in_list_mode = False
-                    
-                    content = stripped_line[4:] # "### " 除去
-                    await self.click_plus_menu("小見出し")
-                    await self.paste_text(content)
-                    await self.page.keyboard.press("Enter")
-                    await asyncio.sleep(0.5)
-                    continue
-
-                # --- 引用 (> ) ---
-                if stripped_line.startswith('> '):
-                    if in_list_mode:
-                        await self.page.keyboard.press("Enter")
-                        in_list_mode = False
-                    
-                    content = stripped_line[2:] # "> " 除去
-                    await self.click_plus_menu("引用")
-                    await self.paste_text(content)
-                    await self.page.keyboard.press("Enter")
-                    await asyncio.sleep(0.5)
-                    continue
-
-                # --- 箇条書きリスト (- / *) ---
-                if stripped_line.startswith(('- ', '* ')):
-                    content = stripped_line[2:] # "- " 除去
-                    
-                    if in_list_mode:
-                        await self.paste_text(content)
-                    else:
-                        await self.click_plus_menu("箇条書きリスト")
-                        await self.paste_text(content)
-                        in_list_mode = True # モードON
-                    
-                    await self.page.keyboard.press("Enter")
-                    await asyncio.sleep(0.5)
-                    continue
-
-                # --- 番号付きリスト (1. ) ---
-                if re.match(r'^\d+\.\s', stripped_line):
-                    content = re.sub(r'^\d+\.\s', '', stripped_line) # "1. " 除去
-                    
-                    if in_list_mode:
-                         await self.paste_text(content)
-                    else:
-                        await self.click_plus_menu("番号付きリスト")
-                        await self.paste_text(content)
-                        in_list_mode = True
-                        
-                    await self.page.keyboard.press("Enter")
-                    await asyncio.sleep(0.5)
-                    continue
-
-                # --- 通常テキスト・埋め込み ---
-                if in_list_mode:
-                    # リストモード終了
-                    await self.page.keyboard.press("Enter")
-                    in_list_mode = False
-                    await asyncio.sleep(0.2)
-                
-                # 太字行の処理 (**text**)
-                # NoteはMarkdownの太字を自動変換しないため、手動でCmd+Bを入れる
-                bold_match = re.match(r'^\*\*(.+?)\*\*$', stripped_line)
-                if bold_match:
-                    content = bold_match.group(1)
-                    # 1. テキスト入力
-                    await self.paste_text(content)
-                    await asyncio.sleep(0.2)
-                    
-                    # 2. 全選択 (行末にいるのでShift+Cmd+Left)
-                    await self.page.keyboard.down("Shift")
-                    await self.page.keyboard.down("Meta")
-                    await self.page.keyboard.press("ArrowLeft")
-                    await self.page.keyboard.up("Meta")
-                    await self.page.keyboard.up("Shift")
-                    await asyncio.sleep(0.2)
-
-                    # 3. 太字ショートカット (Cmd+B) -> 選択範囲が太字になる
-                    await self.page.keyboard.press("Meta+b")
-                    await asyncio.sleep(0.2)
-
-                    # 4. 選択解除 (右矢印) -> カーソルはまだ「太字モード」のまま
-                    await self.page.keyboard.press("ArrowRight")
-                    await asyncio.sleep(0.2)
-
-                    # 5. 太字モード解除 (ここでもう一度Cmd+Bし、以降の入力をRegularに戻す)
-                    await self.page.keyboard.press("Meta+b")
-                    await asyncio.sleep(0.2)
-                    
-                    # 6. 改行
-                    await self.page.keyboard.press("Enter")
-                    await asyncio.sleep(0.5)
-                    continue
-
-                # 埋め込み(URL)の場合
-                if stripped_line.startswith("http"):
-                     await self.paste_text(stripped_line)
-                     await self.page.keyboard.press("Enter")
-                     await asyncio.sleep(2.0) # カード化待機
-                else:
-                     await self.paste_text(line) # stripせず元のインデント等を維持しても良いが、今回は基本strip
-                     await self.page.keyboard.press("Enter")
+                    await self.waiter.sleep("title", 1)
+
+        # 本文エリアにフォーカス
+        await self.page.click(EDITOR_SELECTOR)
+        await self.waiter.sleep("focus", 0.5)
+
+        if resumed:
+            # 既存の下書きではクリック位置に挿入しないよう、必ずキャレットを本文末尾へ移す
+            if not await self.page.evaluate(_CARET_TO_END_JS, EDITOR_SELECTOR):
+                await self.press_enter()
+
+        # ブロックを順番に投入
+        # 各ブロックは「投入後、カーソルが新しい空段落にある」状態で終わる
+        name = os.path.basename(self.article_path)
+        total = len(self.blocks)
+        for i in range(start, total):
+            block = self.blocks[i]
+            progress = int((i + 1) / total * 100)
+            print(f"[{progress:3d}%] {name} ブロック {i+1}/{total}: {block.kind} {block.describe()}", flush=True)
+            async with self.timer.span(block.kind):
+                await self.insert_block(block)
+            self._save_state(committed=i, draft_url=self._draft_url())
+
+        self._save_state(status="done", draft_url=self._draft_url())
+        print(self.timer.summary(f"Phase Timing ({name} / {self.wait_mode})"), flush=True)
+        print(f"    selector map: hit {self.selectors.hits} / fallback scan {self.selectors.misses}", flush=True)
+        return self.state["draft_url"]
+
+    # ---------------------------------------------------------
+    # 再開用チェックポイント
+    # ---------------------------------------------------------
+    def _state_path(self):
+        stem = os.path.splitext(os.path.basename(self.article_path))[0]
+        digest = hashlib.sha1(os.path.abspath(self.article_path).encode("utf-8")).hexdigest()[:8]
+        return os.path.join(self.state_dir, f"{stem}_{digest}.json")
+
+    def _new_state(self):
+        return {
+            "article": os.path.abspath(self.article_path),
+            "status": "in_progress",
+            "draft_url": None,
+            "committed": -1,
+            "banner_done": False,
+            "block_hashes": [block.fingerprint() for block in self.blocks],
+            "last_updated": datetime.datetime.now().isoformat(),
+        }
+
+    def _load_state(self):
+        path = self._state_path()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return None
+
+    def _save_state(self, **updates):
+        """一時ファイルに書いてから置き換える（書き込み中のクラッシュで壊れないように）"""
+        self.state.update(updates)
+        self.state["last_updated"] = datetime.datetime.now().isoformat()
+        path = self._state_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def _draft_url(self):
+        """下書きURL（自動保存前で notes/new のままなら、既知のURLを維持）"""
+        url = self.page.url
+        if url and "/notes/new" not in url:
+            return url
+        return self.state.get("draft_url")
+
+    async def _open_editor(self, url):
+        """URLを開き、エディタの準備を待つ"""
+        await self.page.goto(url)
+        print(">>> エディタの準備を待機中...", flush=True)
+        try:
+            await self.page.wait_for_selector(
+                'textarea[placeholder*="タイトル"], div[contenteditable="true"]',
+                timeout=300000
+            )
+        except Exception:
+            raise EditorNotReady("エディタが見つかりませんでした")
 
-                await asyncio.sleep(0.5)
-            
-            print(">>> 完了！下書きを確認してください。", flush=True)
-            print(">>> 30秒後にブラウザを閉じます...", flush=True)
+        await self.waiter.sleep("ready", 2)
+
+    async def _editor_snapshot(self):
+        """本文エディタの表示を待ち、本文の文字・画像数・埋め込み数を読む"""
+        try:
+            await self.page.wait_for_selector(EDITOR_SELECTOR, timeout=30000)
+        except Exception:
+            raise EditorNotReady("本文エディタが見つかりませんでした")
+        return await self.page.evaluate(_EDITOR_SNAPSHOT_JS, {"editor": EDITOR_SELECTOR, "embed": EMBED_SELECTOR})
+
+    async def _draft_has_body(self):
+        """下書きの本文に文字・画像・埋め込みが入っているか"""
+        snapshot = await self._editor_snapshot()
+        return bool(snapshot) and bool(snapshot["text"].strip() or snapshot["images"] or snapshot["embeds"])
+
+    def _committed_prefix(self, state):
+        """記事が編集されていた場合は、内容が一致する先頭ブロックまでを確定済みとみなす"""
+        stored = state.get("block_hashes", [])
+        same = 0
+        for block, digest in zip(self.blocks, stored):
+            if block.fingerprint() != digest:
+                break
+            same += 1
+        state["block_hashes"] = [block.fingerprint() for block in self.blocks]
+        return min(state.get("committed", -1), same - 1)
+
+    async def _verify_resume(self, committed):
+        """
+        エディタDOMと照合し、最初に「反映されていない」ブロックの番号を返す。
+        テキスト系は本文中の出現順、画像・埋め込みは要素数で確認する。
+        確認手段のないブロック（目次・区切り線など）はチェックポイントを信用する。
+        """
+        snapshot = await self._editor_snapshot()
+        if not snapshot:
+            return committed + 1
+
+        text = snapshot["text"]
+        cursor = 0
+        images = embeds = 0
+        for i, block in enumerate(self.blocks):
+            signature = block.signature_lines()
+            if signature:
+                landed = True
+                position = cursor
+                for line in signature:
+                    found = text.find(line, position)
+                    if found < 0:
+                        landed = False
+                        break
+                    position = found + len(line)
+                if landed:
+                    cursor = position
+            elif block.kind == "image" and os.path.exists(block.path):
+                images += 1
+                landed = snapshot["images"] >= images
+            elif block.kind == "embed":
+                embeds += 1
+                landed = snapshot["embeds"] >= embeds
+            else:
+                landed = i <= committed
+
+            if not landed:
+                if i <= committed:
+                    print(f">>> [Resume] 警告: 確定済みのブロック {i + 1} がエディタに見つかりません。", flush=True)
+                return i
+        return len(self.blocks)
+
+    async def set_banner(self):
+        """見出し画像（バナー）を設定する"""
+        print(f">>> バナー画像設定: {self.banner_path}", flush=True)
+        
+        # ユーザー情報により 'aria-label="画像を追加"' が正解と判明。
+        # 複数ある場合は最初の方（ヘッダー付近）にあるものが対象（query_selectorは先頭を返す）
+        target_btn = await self.selectors.find(self.page, "banner_add")
+        if target_btn:
+            print("   >>> '画像を追加' ボタンを発見しました。", flush=True)
+        else:
+            print("   >>> エラー: '画像を追加' ボタンが見つかりません。", flush=True)
+            return
+
+        await target_btn.click()
+        await self.waiter.menu_item(
+            self.selectors.selectors.get("banner_upload", ':is(button, div):has-text("画像をアップロード")'),
+            fallback=1.0,
+        )
+        
+        # メニューが開いたと仮定
+        async with self.page.expect_file_chooser() as fc_info:
+            # "画像をアップロード" というテキストを持つ要素を探す
+            # 親がbuttonである可能性が高いので、buttonを優先し、なければdivで探す（ページ内で1回の走査）
+            upload_btn = await self.selectors.find(self.page, "banner_upload")
             
-            try:
-                await asyncio.sleep(30)
-            except asyncio.CancelledError:
-                pass
+            if not upload_btn:
+                print("   >>> エラー: 「画像をアップロード」メニューが見つかりません。", flush=True)
+                return
+
+            print("   >>> '画像をアップロード' メニューをクリックします。", flush=True)
+            await upload_btn.click()
             
-            print(">>> ブラウザを閉じています...", flush=True)
-            await context.close()
-            print(">>> 正常終了しました。", flush=True)
+        banner_path = await self.images.resolve(self.banner_path)
+        file_chooser = await fc_info.value
+        await file_chooser.set_files(banner_path)
+        print("   >>> 画像ファイルを選択しました。保存ボタンの表示を待ちます...", flush=True)
+        # モーダル表示待ち（fast: 完全一致の「保存」ボタンが出た時点で解決）
+        save_selector = 'button:text-is("保存")'
+        await self.waiter.visible("banner-modal", save_selector, fallback=4.0, timeout_ms=15000)
+        
+        # トリミング/確認画面の「保存」ボタンを押す
+        # 全ボタンをテキストマッチで探す（ページ内で1回のevaluate）
+        # 注意: ヘッダーの「下書き保存」を誤クリックしないよう、逆順（DOMの後ろから）かつ完全一致で探す
+        save_btn = await self.selectors.find(self.page, "banner_save")
+        if save_btn:
+            print("   >>> '保存' ボタンを発見。クリックします。", flush=True)
+            await save_btn.click(force=True)
+        else:
+            print("   >>> エラー: '保存' ボタンが見つかりませんでした。", flush=True)
+
+        # 適用待ち（fast: モーダルが閉じた時点で解決）
+        await self.waiter.hidden("banner-apply", save_selector, fallback=5.0, timeout_ms=30000)
 
 if __name__ == "__main__":
-    publisher = ProsperPublisherV10(ARTICLE_PATH)
-    if publisher.parse_markdown():
-        try:
-            asyncio.run(publisher.publish())
-        except KeyboardInterrupt:
-            print("\n>>> ユーザーによる中断。", flush=True)
+    parser = argparse.ArgumentParser(description="Prosper Publisher V10 (note.com draft publisher)")
+    parser.add_argument("article", nargs="?", default=ARTICLE_PATH, help="Markdown article path")
+    parser.add_argument("--wait-mode", choices=WAIT_MODES, default="fast",
+                        help="fast: wait on editor events / conservative: fixed sleeps (V10 behavior)")
+    parser.add_argument("--insert-mode", choices=INSERT_MODES, default="html",
+                        help="html: paste paragraph/list blocks in bulk / line: type line by line (V10 behavior)")
+    parser.add_argument("--account", help="Account name (overrides [ACCOUNT]: in the article)")
+    parser.add_argument("--fresh", action="store_true", help="Ignore saved checkpoints and start a new draft")
+    parser.add_argument("--headless", action="store_true", help="Launch the browser without a window")
+    parser.add_argument("--no-attach", action="store_true", help="Do not attach to a running browser_daemon.py")
+    parser.add_argument("--image-format", choices=IMAGE_FORMATS, default="jpeg",
+                        help="Re-encode [IMAGE]/[BANNER] before upload (original: upload as is)")
+    parser.add_argument("--image-width", type=int, default=1280, help="Max image width in px")
+    parser.add_argument("--image-quality", type=int, default=82, help="JPEG/WebP quality")
+    parser.add_argument("--queue", nargs="+", metavar="PATH_OR_GLOB",
+                        help="Publish many articles concurrently (files, directories or globs)")
+    parser.add_argument("--concurrency", type=int, default=2, help="Queue mode: number of pages in parallel")
+    parser.add_argument("--retries", type=int, default=1, help="Queue mode: retries per article")
+    parser.add_argument("--log", default=QUEUE_LOG_PATH, help="Queue mode: JSONL result log path")
+    args = parser.parse_args()
+
+    images = ImagePipeline(IMAGE_CACHE_DIR, max_width=args.image_width, fmt=args.image_format,
+                           quality=args.image_quality)
+
+    def make_publisher(path):
+        return ProsperPublisherV10(path, wait_mode=args.wait_mode, insert_mode=args.insert_mode,
+                                   account=args.account, resume=not args.fresh, images=images,
+                                   headless=args.headless, attach=not args.no_attach)
+
+    try:
+        if args.queue:
+            queue = PublishQueue(
+                collect_articles(args.queue), make_publisher, USER_DATA_DIR,
+                concurrency=args.concurrency, retries=args.retries, log_path=args.log,
+                headless=args.headless, attach=not args.no_attach,
+            )
+            asyncio.run(queue.run())
+        else:
+            publisher = make_publisher(args.article)
+            if publisher.parse_markdown():
+                asyncio.run(publisher.publish())
+    except KeyboardInterrupt:
+        print("\n>>> ユーザーによる中断。", flush=True)
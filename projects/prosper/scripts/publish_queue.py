@@ -0,0 +1,132 @@
+"""
+Publish Queue
+=============
+複数のMarkdown記事を並行して下書き投稿するキュー。
+- 入力: ファイル / ディレクトリ / glob の混在
+- 同じアカウントの記事は1つの永続コンテキストを共有し、ページ（タブ）単位で並行処理
+- 記事ごとのリトライと、結果のJSONLログ出力
+"""
+
+import os
+import glob
+import json
+import time
+import asyncio
+import datetime
+from playwright.async_api import async_playwright
+
+from browser_session import open_note_context
+
+
+def collect_articles(patterns):
+    """ファイル・ディレクトリ・globパターンから記事パスを重複なく集める（順序保持）"""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(glob.glob(os.path.join(pattern, "*.md")))
+        else:
+            matches = sorted(glob.glob(pattern)) or ([pattern] if os.path.exists(pattern) else [])
+        if not matches:
+            print(f">>> 警告: 該当する記事がありません: {pattern}", flush=True)
+        paths.extend(os.path.abspath(m) for m in matches)
+    return list(dict.fromkeys(paths))
+
+
+class PublishQueue:
+    def __init__(self, article_paths, make_publisher, user_data_dir,
+                 concurrency=2, retries=1, log_path=None, headless=False, attach=True):
+        self.article_paths = article_paths
+        self.make_publisher = make_publisher # path -> ProsperPublisherV10
+        self.user_data_dir = user_data_dir
+        self.concurrency = max(1, concurrency)
+        self.retries = max(0, retries)
+        self.log_path = log_path
+        self.headless = headless
+        self.attach = attach
+
+        self.playwright = None
+        self.sessions = {}       # account -> NoteSession
+        self.context_locks = {}  # account -> asyncio.Lock
+        self.results = []
+
+    async def _context_for(self, account):
+        """アカウントの永続コンテキストを（初回のみ）起動または常駐ブラウザに接続して返す"""
+        lock = self.context_locks.setdefault(account, asyncio.Lock())
+        async with lock:
+            if account not in self.sessions:
+                print(f">>> [Queue] コンテキスト準備: account={account}", flush=True)
+                self.sessions[account] = await open_note_context(
+                    self.playwright, self.user_data_dir, account, headless=self.headless, attach=self.attach
+                )
+            return self.sessions[account].context
+
+    def _log(self, record):
+        self.results.append(record)
+        if not self.log_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    async def _publish_one(self, path, slots):
+        publisher = self.make_publisher(path)
+        record = {
+            "article": path,
+            "account": None,
+            "status": "failed",
+            "attempts": 0,
+            "elapsed": 0.0,
+            "blocks": 0,
+            "draft_url": None,
+            "error": None,
+        }
+        started = time.perf_counter()
+
+        if not publisher.parse_markdown():
+            record["error"] = "parse failed"
+        else:
+            record["account"] = publisher.account
+            record["blocks"] = len(publisher.blocks)
+            async with slots:
+                context = await self._context_for(publisher.account)
+                for attempt in range(1, self.retries + 2):
+                    record["attempts"] = attempt
+                    page = await context.new_page()
+                    try:
+                        record["draft_url"] = await publisher.publish_to_page(page)
+                        record["status"] = "ok"
+                        record["error"] = None
+                        break
+                    except Exception as e:
+                        record["error"] = f"{type(e).__name__}: {e}"
+                        print(f">>> [Queue] 失敗 ({attempt}/{self.retries + 1}): {os.path.basename(path)}: {e}", flush=True)
+                        if attempt <= self.retries:
+                            await asyncio.sleep(2 ** attempt)
+                    finally:
+                        await page.close()
+
+        record["elapsed"] = round(time.perf_counter() - started, 2)
+        record["finished_at"] = datetime.datetime.now().isoformat()
+        print(f">>> [Queue] {record['status'].upper()}: {os.path.basename(path)} ({record['elapsed']}s)", flush=True)
+        self._log(record)
+        return record
+
+    async def run(self):
+        print(f">>> [Queue] {len(self.article_paths)}件を並列数{self.concurrency}で投稿します", flush=True)
+        started = time.perf_counter()
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async with async_playwright() as p:
+            self.playwright = p
+            try:
+                await asyncio.gather(*(self._publish_one(path, slots) for path in self.article_paths))
+            finally:
+                for session in self.sessions.values():
+                    await session.close()
+
+        ok = sum(1 for r in self.results if r["status"] == "ok")
+        print(f">>> [Queue] 完了: 成功 {ok} / 失敗 {len(self.results) - ok} "
+              f"(wall {time.perf_counter() - started:.1f}s)", flush=True)
+        if self.log_path:
+            print(f">>> [Queue] 結果ログ: {self.log_path}", flush=True)
+        return self.results
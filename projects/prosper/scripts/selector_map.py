@@ -0,0 +1,170 @@
+"""
+Selector Map
+============
+debug_selector.py が生成したセレクタ対応表（論理名 -> CSS）を読み込み、要素解決をキャッシュする。
+- 起動時に1回のevaluateで全セレクタの有効性を確認し、無効なものは捨てる
+- テキストで探す項目（保存ボタン・+メニュー項目など）は、対応表の要素の表示名も確認してから使う
+  （構造的なパスはUI変更で隣のボタンを指すことがあるため）
+- 対応表に無い/外れた場合のみ、ページ内の1回のevaluateで全走査して要素を返す
+  （ボタンごとに inner_text() を往復する方式を置き換える）
+"""
+
+import os
+import json
+
+# 論理名ごとの既定の探し方（対応表が無い・外れた場合に使う）
+# css: そのまま試すセレクタ / tags+text: テキスト一致の走査
+TARGETS = {
+    "title": {"css": 'textarea[placeholder*="タイトル"]'},
+    "editor": {"css": 'div[contenteditable="true"][role="textbox"]'},
+    "plus_menu": {"css": 'button[aria-label="メニューを開く"]'},
+    "banner_add": {"css": 'button[aria-label="画像を追加"]'},
+    "banner_upload": {"tags": ["button", "div"], "text": "画像をアップロード"},
+    # ヘッダーの「下書き保存」を誤クリックしないよう、逆順（DOMの後ろから）かつ完全一致で探す
+    "banner_save": {"tags": ["button"], "text": "保存", "exact": True, "reverse": True},
+}
+
+# +メニューの項目（論理名は "menu:<表示名>"）
+MENU_ITEMS = ["大見出し", "小見出し", "引用", "箇条書きリスト", "番号付きリスト", "区切り線", "画像", "目次", "有料エリア指定"]
+
+# エディタ画面を開いた直後に存在するはずのもの（起動時検証の対象）
+STARTUP_TARGETS = ["title", "editor", "plus_menu", "banner_add"]
+
+
+def target_spec(name):
+    if name.startswith("menu:"):
+        return {"tags": ["button"], "text": name[len("menu:"):]}
+    return TARGETS[name]
+
+
+# 要素を一意に指すCSSセレクタを生成する（debug_selectorのスナップショットで使用）
+UNIQUE_SELECTOR_JS = """
+(el) => {
+    const esc = (v) => CSS.escape(v);
+    const unique = (sel) => { try { return document.querySelectorAll(sel).length === 1; } catch (e) { return false; } };
+    if (el.id && unique('#' + esc(el.id))) return '#' + esc(el.id);
+    for (const attr of ['data-testid', 'aria-label', 'placeholder', 'name']) {
+        const v = el.getAttribute(attr);
+        if (v) {
+            const sel = `${el.tagName.toLowerCase()}[${attr}="${v.replace(/"/g, '\\\\"')}"]`;
+            if (unique(sel)) return sel;
+        }
+    }
+    const parts = [];
+    let node = el;
+    while (node && node.nodeType === 1 && node !== document.body) {
+        let part = node.tagName.toLowerCase();
+        const parent = node.parentElement;
+        if (parent) {
+            const same = Array.from(parent.children).filter(c => c.tagName === node.tagName);
+            if (same.length > 1) part += `:nth-of-type(${same.indexOf(node) + 1})`;
+        }
+        parts.unshift(part);
+        const sel = parts.join(' > ');
+        if (unique(sel)) return sel;
+        node = parent;
+    }
+    return parts.join(' > ');
+}
+"""
+
+_VALIDATE_JS = """
+(selectors) => {
+    const result = {};
+    for (const [name, sel] of Object.entries(selectors)) {
+        try { result[name] = document.querySelector(sel) !== null; } catch (e) { result[name] = false; }
+    }
+    return result;
+}
+"""
+
+# 対応表のセレクタで要素を引き、テキストで探す項目なら表示名も一致するか確かめる
+# (一致しなければ "stale" を返す)
+_RESOLVE_JS = """
+({css, text, exact}) => {
+    let el;
+    try { el = document.querySelector(css); } catch (e) { return null; }
+    if (!el || text === null) return el;
+    const t = (el.innerText || '').trim();
+    return (exact ? t === text : t.includes(text)) ? el : "stale";
+}
+"""
+
+# テキスト一致の全走査をページ内で1回だけ行う
+SCAN_JS = """
+({tags, text, exact, reverse}) => {
+    const visible = (el) => el.getClientRects().length > 0;
+    for (const tag of tags) {
+        let nodes = Array.from(document.querySelectorAll(tag));
+        if (reverse) nodes.reverse();
+        let best = null;
+        for (const el of nodes) {
+            const t = (el.innerText || '').trim();
+            const hit = exact ? t === text : t.includes(text);
+            if (!hit || !visible(el)) continue;
+            if (exact) return el;
+            // 部分一致は最も内側（テキストが短い）要素を選ぶ
+            if (!best || t.length < best.innerText.trim().length) best = el;
+        }
+        if (best) return best;
+    }
+    return null;
+}
+"""
+
+
+class SelectorMap:
+    def __init__(self, path=None):
+        self.path = path
+        self.selectors = {} # 論理名 -> CSS（debug_selectorで解決済み）
+        self.hits = 0
+        self.misses = 0
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.selectors = json.load(f).get("selectors", {})
+
+    async def validate(self, page, names=STARTUP_TARGETS):
+        """起動時チェック: 対応表のセレクタを1回のevaluateで確認し、外れたものを捨てる"""
+        candidates = {name: self.selectors[name] for name in names if name in self.selectors}
+        if not candidates:
+            return
+        result = await page.evaluate(_VALIDATE_JS, candidates)
+        stale = [name for name, ok in result.items() if not ok]
+        for name in stale:
+            del self.selectors[name]
+        print(f">>> [Selector] 対応表 {len(candidates) - len(stale)}/{len(candidates)} 件有効"
+              f"{' (無効: ' + ', '.join(stale) + ')' if stale else ''}", flush=True)
+
+    async def find(self, page, name):
+        """論理名から要素を解決する。見つからなければNone"""
+        spec = target_spec(name)
+        css = self.selectors.get(name)
+        if css:
+            handle = await page.evaluate_handle(_RESOLVE_JS, {
+                "css": css,
+                "text": spec.get("text"),
+                "exact": spec.get("exact", False),
+            })
+            element = handle.as_element()
+            if element:
+                self.hits += 1
+                return element
+            if await handle.json_value() == "stale":
+                # UI変更で別のボタンを指している (例: 「保存」のつもりが「下書き保存」)
+                print(f">>> [Selector] 対応表の {name} が「{spec['text']}」ではない要素を指しているため、走査に切り替えます", flush=True)
+                del self.selectors[name]
+            await handle.dispose()
+
+        self.misses += 1
+        if "css" in spec:
+            return await page.query_selector(spec["css"])
+        handle = await page.evaluate_handle(SCAN_JS, {
+            "tags": spec["tags"],
+            "text": spec["text"],
+            "exact": spec.get("exact", False),
+            "reverse": spec.get("reverse", False),
+        })
+        element = handle.as_element()
+        if element is None:
+            await handle.dispose()
+        return element